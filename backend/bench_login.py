@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Login benchmark for the password hashing cost settings.
+
+For each scrypt cost it stores a user hashed at that cost, fires a burst of
+concurrent logins at /api/login (through Flask's test client, so no server is
+needed) and reports login throughput and latency. While the burst runs it also
+polls /api/health to show how much the logins slow down unrelated requests.
+
+    python bench_login.py
+    python bench_login.py --costs 13,14,15 --logins 200 --concurrency 32 --workers 4
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+# Never send email or touch a real database from the benchmark (it clears the user store), whatever .env says
+os.environ['GMAIL_USER'] = ''
+os.environ['GMAIL_PASSWORD'] = ''
+os.environ['STORAGE_ENGINE'] = 'memory'
+
+import main
+from passwords import PasswordHasher
+
+EMAIL = 'bench@university.edu'
+PASSWORD = 'password123'
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def timed_login(_) -> float:
+    client = main.app.test_client()
+    start = time.perf_counter()
+    response = client.post('/api/login', json={'email': EMAIL, 'password': PASSWORD})
+    elapsed = time.perf_counter() - start
+    if response.status_code != 200:
+        raise RuntimeError(f'Login failed: {response.status_code} {response.get_data(as_text=True)}')
+    return elapsed
+
+
+def poll_health(stop: threading.Event, samples: List[float]) -> None:
+    client = main.app.test_client()
+    while not stop.is_set():
+        start = time.perf_counter()
+        client.get('/api/health')
+        samples.append(time.perf_counter() - start)
+        time.sleep(0.005)
+
+
+def run(log2_n: int, logins: int, concurrency: int, workers: int) -> None:
+    main.password_hasher = PasswordHasher(n=2 ** log2_n, workers=workers, max_pending=logins)
+    main.users.clear()
+    main.users.add({'id': 'bench', 'email': EMAIL, 'password_hash': main.hash_password(PASSWORD),
+                    'first_name': 'Bench', 'last_name': 'User', 'verified': True})
+
+    health: List[float] = []
+    stop = threading.Event()
+    poller = threading.Thread(target=poll_health, args=(stop, health))
+    poller.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed_login, range(logins)))
+    wall = time.perf_counter() - start
+    stop.set()
+    poller.join()
+    main.password_hasher.shutdown()
+
+    print(f"n=2^{log2_n:<3} {logins / wall:8.1f} logins/s   "
+          f"login p50 {percentile(latencies, 50) * 1000:7.1f}ms  p95 {percentile(latencies, 95) * 1000:7.1f}ms  "
+          f"p99 {percentile(latencies, 99) * 1000:7.1f}ms   "
+          f"health p50 {statistics.median(health) * 1000:5.1f}ms  p95 {percentile(health, 95) * 1000:5.1f}ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--costs', default='12,13,14,15', help='comma-separated log2 of the scrypt n parameter')
+    parser.add_argument('--logins', type=int, default=100, help='logins per cost setting')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent login requests')
+    parser.add_argument('--workers', type=int, default=main.password_hasher.workers, help='password hashing threads')
+    args = parser.parse_args()
+
+    print(f"{args.logins} logins, {args.concurrency} concurrent, {args.workers} hashing threads, r=8 p=1")
+    for cost in args.costs.split(','):
+        run(int(cost), args.logins, args.concurrency, args.workers)
@@ -0,0 +1,2 @@
+# test_cors.py is a manual check run against a live server, not a pytest module
+collect_ignore = ['test_cors.py']
@@ -0,0 +1,180 @@
+"""
+Email templates for LiftLink notifications.
+
+Templates are compiled once at import into literal/placeholder segments, so
+rendering is a single substitution pass and a join. Placeholders are written
+{{name}}; in HTML templates values are escaped unless written {{&name}} (for
+fragments that were rendered from another template). The MIME layout is
+precompiled too: a rendered email is turned into wire-format bytes by filling
+a fixed multipart/alternative skeleton instead of building a MIME tree.
+"""
+import binascii
+import html
+import re
+import uuid
+from email.header import Header
+from email.utils import formatdate, make_msgid
+from typing import Dict, List, Tuple
+
+_PLACEHOLDER = re.compile(r'\{\{(&?)\s*(\w+)\s*\}\}')
+
+
+class Template:
+    """A template compiled into alternating literal text and placeholders"""
+
+    def __init__(self, source: str, escape_html: bool = False):
+        pieces = _PLACEHOLDER.split(source)
+        # split() yields [literal, flag, name, literal, flag, name, ..., literal]
+        self._parts: List[str] = []
+        self._slots: List[Tuple[int, str, bool]] = []  # (index in _parts, name, escape)
+        for i in range(0, len(pieces), 3):
+            self._parts.append(pieces[i])
+            if i + 2 < len(pieces):
+                raw = pieces[i + 1] == '&'
+                self._slots.append((len(self._parts), pieces[i + 2], escape_html and not raw))
+                self._parts.append('')
+
+    def render(self, values: Dict[str, object]) -> str:
+        parts = self._parts.copy()
+        for index, name, escape in self._slots:
+            value = '' if values.get(name) is None else str(values[name])
+            parts[index] = html.escape(value) if escape else value
+        return ''.join(parts)
+
+
+class EmailTemplate:
+    """Subject, plain-text and HTML templates for one kind of email"""
+
+    def __init__(self, subject: str, text: str, html_body: str):
+        self.subject = Template(subject)
+        self.text = Template(text)
+        self.html = Template(html_body, escape_html=True)
+
+    def render(self, values: Dict[str, object]) -> Tuple[str, str, str]:
+        return self.subject.render(values), self.text.render(values), self.html.render(values)
+
+
+VERIFICATION = EmailTemplate(
+    subject='Verify your LiftLink account',
+    text="""Hi {{first_name}},
+
+Welcome to LiftLink! Please verify your email address by clicking the link below:
+
+{{verification_link}}
+
+If you didn't create an account, please ignore this email.
+
+Best regards,
+The LiftLink Team
+""",
+    html_body="""<html>
+  <body>
+    <h2>Hi {{first_name}},</h2>
+    <p>Welcome to LiftLink! Please verify your email address by clicking the button below:</p>
+    <p><a href="{{verification_link}}" style="background-color: #4CAF50; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; display: inline-block;">Verify Email</a></p>
+    <p>Or copy and paste this link into your browser:</p>
+    <p>{{verification_link}}</p>
+    <p>If you didn't create an account, please ignore this email.</p>
+    <p>Best regards,<br>The LiftLink Team</p>
+  </body>
+</html>
+""",
+)
+
+# One line per match in a match notification; see render_match_items()
+MATCH_ITEM = EmailTemplate(
+    subject='',
+    text="""- {{partner_name}} ({{partner_email}}){{context}}
+""",
+    html_body="""      <li><strong>{{partner_name}}</strong> (<a href="mailto:{{partner_email}}">{{partner_email}}</a>){{context}}</li>
+""",
+)
+
+MATCH = EmailTemplate(
+    subject='{{headline}} on LiftLink',
+    text="""Hi {{first_name}},
+
+You have new workout partners on LiftLink:
+
+{{&matches_text}}
+Reach out to them to plan your session!
+
+Best regards,
+The LiftLink Team
+""",
+    html_body="""<html>
+  <body>
+    <h2>Hi {{first_name}},</h2>
+    <p>You have new workout partners on LiftLink:</p>
+    <ul>
+{{&matches_html}}    </ul>
+    <p>Reach out to them to plan your session!</p>
+    <p>Best regards,<br>The LiftLink Team</p>
+  </body>
+</html>
+""",
+)
+
+
+def render_match_items(matches: List[Dict[str, object]]) -> Dict[str, str]:
+    """Render MATCH_ITEM for each match into MATCH's matches_text/matches_html values"""
+    text = html_items = ''
+    for match in matches:
+        _, item_text, item_html = MATCH_ITEM.render(match)
+        text += item_text
+        html_items += item_html
+    return {'matches_text': text, 'matches_html': html_items}
+
+
+# Fixed multipart/alternative layout; the boundary is chosen once per process
+_BOUNDARY = f'=_liftlink_{uuid.uuid4().hex}'
+_MESSAGE_LAYOUT = Template(
+    'Subject: {{subject}}\r\n'
+    'From: {{sender}}\r\n'
+    'To: {{to}}\r\n'
+    'Date: {{date}}\r\n'
+    'Message-ID: {{message_id}}\r\n'
+    'MIME-Version: 1.0\r\n'
+    f'Content-Type: multipart/alternative; boundary="{_BOUNDARY}"\r\n'
+    '\r\n'
+    f'--{_BOUNDARY}\r\n'
+    'Content-Type: text/plain; charset="utf-8"\r\n'
+    'Content-Transfer-Encoding: quoted-printable\r\n'
+    '\r\n'
+    '{{text}}\r\n'
+    f'--{_BOUNDARY}\r\n'
+    'Content-Type: text/html; charset="utf-8"\r\n'
+    'Content-Transfer-Encoding: quoted-printable\r\n'
+    '\r\n'
+    '{{html}}\r\n'
+    f'--{_BOUNDARY}--\r\n'
+)
+
+
+def _encode_header(value: str) -> str:
+    if value.isascii():
+        return value
+    return Header(value, 'utf-8').encode()
+
+
+def _encode_body(value: str) -> str:
+    """Quoted-printable body with CRLF line endings"""
+    encoded = binascii.b2a_qp(value.encode('utf-8')).decode('ascii')
+    return encoded.replace('\r\n', '\n').replace('\n', '\r\n')
+
+
+def build_message(template: EmailTemplate, values: Dict[str, object], sender: str, to: str) -> bytes:
+    """Render a template and assemble the complete message as SMTP-ready bytes"""
+    if any(c in header for header in (sender, to) for c in '\r\n'):
+        raise ValueError('Email addresses must not contain line breaks')
+    subject, text, html_body = template.render(values)
+    subject = ' '.join(subject.split())  # Keep user-supplied values from breaking the header
+    return _MESSAGE_LAYOUT.render({
+        'subject': _encode_header(subject),
+        'sender': sender,
+        'to': to,
+        'date': formatdate(localtime=True),
+        'message_id': make_msgid(domain='liftlink'),
+        'text': _encode_body(text),
+        'html': _encode_body(html_body),
+    }).encode('utf-8')
@@ -0,0 +1,151 @@
+"""
+Server-sent events for per-user state changes.
+
+Handlers publish small events (a request arrived or was answered, the email
+was verified) to a user's open event streams through an in-process EventHub.
+Each stream is a subscription with a short bounded queue. A client that stops
+reading and lets its queue fill up is disconnected instead of buffering
+without limit; its browser reconnects and the stream starts with a `ready`
+event telling it to resync.
+
+Streams come in two kinds. ThreadSubscription blocks a request thread (the
+Flask dev server). AsyncSubscription is awaited on an asyncio event loop
+(serve.py), so an idle connection costs a coroutine rather than a thread.
+Publishing is thread-safe and never blocks on a subscriber.
+
+Events only reach streams in the process that published them. With several
+workers, clients should also resync from the change feeds on `ready`.
+"""
+import asyncio
+import json
+import queue
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Set
+
+KEEPALIVE = b': keepalive\n\n'  # comment line; keeps proxies from closing an idle stream
+RETRY = b'retry: 5000\n\n'  # browser reconnect delay (ms)
+
+
+def format_event(event: str, data: Dict) -> bytes:
+    """Encode one event in the text/event-stream format"""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+class Subscription(ABC):
+    """One open event stream for a user: a bounded queue of encoded events"""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.closed = False
+
+    @abstractmethod
+    def deliver(self, message: bytes) -> None:
+        """Queue an encoded event without blocking (called under the hub's lock)"""
+
+
+class ThreadSubscription(Subscription):
+    """Subscription read by a blocking request thread"""
+
+    def __init__(self, user_id: str, max_pending: int):
+        super().__init__(user_id)
+        self._queue: "queue.Queue[Optional[bytes]]" = queue.Queue(maxsize=max_pending + 1)
+
+    def deliver(self, message: bytes) -> None:
+        if self.closed:
+            return
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self._overflow()
+
+    def next(self, timeout: float) -> Optional[bytes]:
+        """Next event, KEEPALIVE after timeout seconds without one, or None once closed"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None if self.closed else KEEPALIVE
+
+    def _overflow(self) -> None:
+        # Deliveries are serialized by the hub's lock, so the sentinel always fits once drained
+        self.closed = True
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+
+class AsyncSubscription(Subscription):
+    """Subscription read by a coroutine on an asyncio event loop"""
+
+    def __init__(self, user_id: str, max_pending: int, loop: asyncio.AbstractEventLoop):
+        super().__init__(user_id)
+        self._loop = loop
+        self._queue: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue(maxsize=max_pending + 1)
+
+    def deliver(self, message: bytes) -> None:
+        if not self.closed:
+            # asyncio queues aren't thread-safe; hand the message to the loop's thread
+            self._loop.call_soon_threadsafe(self._put, message)
+
+    async def next(self, timeout: float) -> Optional[bytes]:
+        """Next event, KEEPALIVE after timeout seconds without one, or None once closed"""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None if self.closed else KEEPALIVE
+
+    def _put(self, message: bytes) -> None:
+        if self.closed:
+            return
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.closed = True
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queue.put_nowait(None)
+
+
+class EventHub:
+    """Fans events out to every open stream of a user"""
+
+    def __init__(self, max_pending: int = 32):
+        self.max_pending = max_pending
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Number of open streams"""
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def open(self, user_id: str) -> ThreadSubscription:
+        return self._add(ThreadSubscription(user_id, self.max_pending))
+
+    def open_async(self, user_id: str) -> AsyncSubscription:
+        """Open a stream read on the running event loop"""
+        return self._add(AsyncSubscription(user_id, self.max_pending, asyncio.get_running_loop()))
+
+    def close(self, subscription: Subscription) -> None:
+        subscription.closed = True
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_id: str, event: str, data: Dict) -> None:
+        """Send an event to all of a user's open streams (a no-op if they have none)"""
+        with self._lock:
+            subscriptions = self._subscriptions.get(user_id)
+            if not subscriptions:
+                return
+            message = format_event(event, data)
+            for subscription in subscriptions:
+                subscription.deliver(message)
+
+    def _add(self, subscription):
+        with self._lock:
+            self._subscriptions.setdefault(subscription.user_id, set()).add(subscription)
+        return subscription
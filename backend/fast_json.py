@@ -0,0 +1,103 @@
+"""
+JSON encoding for API responses.
+
+Uses orjson when it's installed (pip install orjson) and the standard
+library otherwise. Both produce the same compact, key-sorted JSON that Flask's
+jsonify does, apart from orjson writing non-ASCII text as UTF-8 instead of
+\\u escapes.
+
+Posts and profiles appear in many list responses and rarely change, so the
+stores keep each record's encoding in a FragmentCache. A list response is then
+assembled by joining those byte fragments into the encoded envelope
+(dumps_with_fragments) instead of re-encoding every record.
+"""
+import json
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from flask.json.provider import DefaultJSONProvider
+
+from records import Record
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Stands in for the fragment list while the envelope is encoded; control characters
+# are always escaped, and only the envelope's own keys and values are encoded with it
+_FRAGMENTS = '\x00fragments\x00'
+_FRAGMENTS_ENCODED = b'"\\u0000fragments\\u0000"'
+
+
+if orjson is not None:
+    # Datetimes go through _default() so both encoders format them the same way
+    _ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def _default(value):
+    # Records and their parsed timestamps become plain JSON here (see records.py)
+    if isinstance(value, Record):
+        return value.to_dict()
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return DefaultJSONProvider.default(value)
+
+
+def dumps(obj) -> bytes:
+    """Compact, key-sorted JSON encoding of obj"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+    return json.dumps(obj, default=_default, separators=(',', ':'), sort_keys=True).encode()
+
+
+def dumps_with_fragments(envelope: Dict, key: str, fragments: List[bytes]) -> bytes:
+    """Encode envelope with envelope[key] set to the JSON array of the pre-encoded fragments"""
+    body = dumps({**envelope, key: _FRAGMENTS})
+    return body.replace(_FRAGMENTS_ENCODED, b'[' + b','.join(fragments) + b']', 1)
+
+
+class FragmentCache:
+    """
+    Encoded records by id. Entries remember the record object they were encoded
+    from and only count while the store still holds that same object, so a
+    copy-on-write update invalidates the entry even before it's discarded.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[Dict, bytes]] = {}
+
+    def encode_all(self, records: List[Dict], current: Callable[[str], Optional[Dict]]) -> List[bytes]:
+        """Encoding of each record; current(id) is the store's record for that id"""
+        fragments = []
+        for record in records:
+            entry = self._entries.get(record['id'])
+            if entry is None or entry[0] is not record:
+                entry = (record, dumps(record))
+                if current(record['id']) is record:
+                    self._entries[record['id']] = entry
+            fragments.append(entry[1])
+        return fragments
+
+    def discard(self, record_id: str) -> None:
+        self._entries.pop(record_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes responses with dumps()"""
+
+    default = staticmethod(_default)
+
+    def dumps(self, obj, **kwargs) -> str:
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps(obj).decode()
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)  # Indented output for debugging
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj) + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,251 @@
+"""
+Outbound email delivery.
+
+Messages are queued by request handlers and sent by background worker threads
+over a small pool of persistent SMTP connections, so a request never waits on
+an SMTP handshake. Workers drain the queue in batches and send each batch on
+one connection, reconnecting when the server has dropped it. Messages that
+couldn't be sent for want of a working connection are queued again after a
+short delay, up to a few attempts.
+
+For local testing point it at a debug server, e.g.
+    python -m aiosmtpd -n -l localhost:1025
+    SMTP_HOST=localhost SMTP_PORT=1025 SMTP_STARTTLS=false SMTP_LOGIN=false
+"""
+import atexit
+import queue
+import smtplib
+import threading
+import time
+from typing import List, Optional, Tuple
+
+# Errors after which a connection can't be trusted and should be replaced. Not plain OSError:
+# every SMTPException is one, including a rejected recipient on a connection that's still fine.
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError)
+
+OutgoingMail = Tuple[List[str], bytes, int]  # (recipients, complete message in wire format, attempts so far)
+
+
+class SMTPConnectionPool:
+    """Reusable logged-in SMTP connections, checked with NOOP when they've sat idle"""
+
+    def __init__(self, host: str, port: int, user: str, password: str,
+                 starttls: bool = True, login: bool = True, max_idle: int = 4,
+                 idle_check_after: float = 30.0, timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.login = login
+        self.max_idle = max_idle
+        self.idle_check_after = idle_check_after
+        self.timeout = timeout
+        self._idle: List[Tuple[smtplib.SMTP, float]] = []  # (connection, last used), most recent last
+        self._lock = threading.Lock()
+
+    def connect(self) -> smtplib.SMTP:
+        """Open and authenticate a new connection"""
+        conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                conn.starttls()
+            if self.login:
+                conn.login(self.user, self.password)
+        except Exception:
+            self.discard(conn)
+            raise
+        return conn
+
+    def acquire(self) -> smtplib.SMTP:
+        """Take an idle connection that still answers, or open a new one"""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, last_used = self._idle.pop()
+            if time.monotonic() - last_used < self.idle_check_after:
+                return conn
+            try:
+                if conn.noop()[0] == 250:
+                    return conn
+            except OSError:  # Dropped, timed out or an SMTP error reply
+                pass
+            self.discard(conn)
+        return self.connect()
+
+    def release(self, conn: smtplib.SMTP) -> None:
+        """Return a healthy connection to the pool (closing it if the pool is full)"""
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append((conn, time.monotonic()))
+                return
+        self.discard(conn)
+
+    def discard(self, conn: smtplib.SMTP) -> None:
+        try:
+            conn.quit()
+        except Exception:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self.discard(conn)
+
+
+class Mailer:
+    """Queue of outgoing messages served by background SMTP workers"""
+
+    def __init__(self, sender: str, pool: SMTPConnectionPool, workers: int = 2, batch_size: int = 20,
+                 max_attempts: int = 3, retry_delay: float = 5.0):
+        self.sender = sender
+        self.pool = pool
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._queue: "queue.Queue[Optional[OutgoingMail]]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._start_lock = threading.Lock()
+
+    @property
+    def configured(self) -> bool:
+        """Whether there is enough configuration to send mail at all"""
+        return bool(self.sender) and (bool(self.pool.password) or not self.pool.login)
+
+    def send(self, to_addrs: List[str], data: bytes) -> bool:
+        """Queue a ready-to-send message for delivery. Returns False if email isn't configured."""
+        if not self.configured:
+            return False
+        self._ensure_started()
+        self._queue.put((to_addrs, data, 0))
+        return True
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued message has been handled. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def shutdown(self, timeout: Optional[float] = 10.0) -> None:
+        """Deliver what's queued (up to timeout), then stop the workers and close connections"""
+        if not self._threads:
+            return
+        self.flush(timeout)
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self.pool.close_all()
+
+    def _ensure_started(self) -> None:
+        # Workers start on first use so importing the app (or forking workers) doesn't spawn threads
+        if self._threads:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'mailer-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _next_batch(self) -> List[Optional[OutgoingMail]]:
+        """Block for one message, then take whatever else is already waiting (up to batch_size)"""
+        batch = [self._queue.get()]
+        while len(batch) < self.batch_size and batch[-1] is not None:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            messages = [msg for msg in batch if msg is not None]
+            try:
+                if messages:
+                    self._retry(self._deliver(messages))
+            except Exception as e:
+                print(f"Error sending email batch: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if len(messages) < len(batch):
+                return  # Shutdown sentinel
+
+    def _retry(self, unsent: List[OutgoingMail]) -> None:
+        """Queue messages again after retry_delay, dropping those that are out of attempts"""
+        retry = []
+        for to_addrs, data, attempts in unsent:
+            if attempts + 1 < self.max_attempts:
+                retry.append((to_addrs, data, attempts + 1))
+            else:
+                print(f"Giving up on email to {', '.join(to_addrs)} after {attempts + 1} attempts")
+        if not retry:
+            return
+        # Requeued before the batch is marked done, so flush() keeps waiting for them
+        time.sleep(self.retry_delay)
+        for mail in retry:
+            self._queue.put(mail)
+
+    def _deliver(self, messages: List[OutgoingMail]) -> List[OutgoingMail]:
+        """Send a batch on one pooled connection, reconnecting once if the server drops it.
+        Returns the messages left unsent because no working connection could be had."""
+        conn: Optional[smtplib.SMTP] = None
+        try:
+            for i, (to_addrs, data, _) in enumerate(messages):
+                reconnected = False
+                while True:
+                    try:
+                        if conn is None:
+                            conn = self.pool.connect() if reconnected else self.pool.acquire()
+                    except OSError as e:
+                        print(f"Error connecting to SMTP server: {str(e)}")
+                        return messages[i:]
+                    try:
+                        conn.sendmail(self.sender, to_addrs, data)
+                        break
+                    except CONNECTION_ERRORS:
+                        pass
+                    except smtplib.SMTPException as e:
+                        # Rejected by the server (bad recipient etc.); the connection is still usable
+                        print(f"Error sending email to {', '.join(to_addrs)}: {str(e)}")
+                        break
+                    except OSError:
+                        pass  # Timeouts and TLS errors leave the connection unusable too
+                    self.pool.discard(conn)
+                    conn = None
+                    if reconnected:
+                        print(f"SMTP connection lost again, retrying {len(messages) - i} email(s) later")
+                        return messages[i:]
+                    reconnected = True
+            return []
+        finally:
+            if conn is not None:
+                self.pool.release(conn)
+
+
+def create_mailer(sender: str, password: str, host: str = 'smtp.gmail.com', port: int = 587,
+                  starttls: bool = True, login: bool = True, workers: int = 2,
+                  batch_size: int = 20, max_attempts: int = 3) -> Mailer:
+    """Build a Mailer whose queued mail is flushed when the process exits"""
+    pool = SMTPConnectionPool(host, port, sender, password, starttls=starttls, login=login, max_idle=workers)
+    mailer = Mailer(sender, pool, workers=workers, batch_size=batch_size, max_attempts=max_attempts)
+    atexit.register(mailer.shutdown)
+    return mailer
@@ -1,18 +1,27 @@
 from flask import Flask, request, jsonify
 from datetime import datetime, timedelta
-import hashlib
+import base64
+import binascii
+import json
 import uuid
-import smtplib
 import os
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
+from storage import open_storage
+from session_tokens import SignedSessionTokens
+from passwords import HasherBusy, PasswordHasher
+from response_cache import ResponseCache
+from mailer import create_mailer
+from notifications import create_match_digests
+from events import EventHub, RETRY, format_event
+from fast_json import FastJSONProvider, dumps_with_fragments
+from email_templates import VERIFICATION, build_message
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)  # orjson when installed (see fast_json.py)
 
 # Add CORS headers to all responses (use set() to avoid duplicates)
 @app.after_request
@@ -36,6 +45,9 @@ def after_request(response):
 @app.route('/api/profiles/<path:path>', methods=['OPTIONS'])
 @app.route('/api/profiles/interest', methods=['OPTIONS'])
 @app.route('/api/requests', methods=['OPTIONS'])
+@app.route('/api/requests/changes', methods=['OPTIONS'])
+@app.route('/api/events', methods=['OPTIONS'])
+@app.route('/api/events/ticket', methods=['OPTIONS'])
 @app.route('/api/verify-email', methods=['OPTIONS'])
 @app.route('/api/resend-verification', methods=['OPTIONS'])
 @app.route('/api/reset', methods=['OPTIONS'])
@@ -43,90 +55,212 @@ def after_request(response):
 def options_handler(path=None):
     return jsonify({}), 200
 
-# In-memory storage (replace with database in production)
-emails: Dict[str, Dict] = {}
-user_sessions: Dict[str, str] = {}  # token -> user_id
-gym_info: Dict[str, Dict] = {}  # user_id -> gym preferences
-posts: List[Dict] = []  # List of all posts/sessions
-interest_requests: List[Dict] = []  # List of interest requests
-verification_tokens: Dict[str, Dict] = {}  # token -> {user_id, email, created_at}
+# Storage engine: 'memory' (default, lost on restart) or 'sqlite' (shared file, multi-process safe)
+STORAGE_ENGINE = os.getenv('STORAGE_ENGINE', 'memory')
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'liftlink.db')
+# Sessions expire SESSION_TTL_HOURS after login; a user's oldest sessions are dropped past the cap
+SESSION_TTL_HOURS = float(os.getenv('SESSION_TTL_HOURS', '168'))
+MAX_SESSIONS_PER_USER = int(os.getenv('MAX_SESSIONS_PER_USER', '10'))
+# Verification links stop working this long after they're sent (resending issues a new one)
+VERIFICATION_TOKEN_TTL_HOURS = float(os.getenv('VERIFICATION_TOKEN_TTL_HOURS', '48'))
+# A ticket for opening an event stream must be used within this many seconds, and only once
+EVENT_TICKET_TTL_SECONDS = float(os.getenv('EVENT_TICKET_TTL_SECONDS', '30'))
+storage = open_storage(STORAGE_ENGINE, SQLITE_PATH,
+                       session_ttl=timedelta(hours=SESSION_TTL_HOURS),
+                       max_sessions_per_user=MAX_SESSIONS_PER_USER,
+                       verification_ttl=timedelta(hours=VERIFICATION_TOKEN_TTL_HOURS),
+                       stream_ticket_ttl=timedelta(seconds=EVENT_TICKET_TTL_SECONDS))
+
+users = storage.users  # email -> user, with a user_id -> user index
+user_sessions = storage.user_sessions  # token -> user_id, with expiry and a user_id -> tokens index
+gym_info = storage.gym_info  # user_id -> gym preferences
+posts = storage.posts  # post_id -> post, with a user_id -> posts index
+interest_requests = storage.interest_requests  # request_id -> request, with receiver/sender indexes
+verification_tokens = storage.verification_tokens  # token -> {user_id, email, created_at}, one live token per user
+stream_tickets = storage.stream_tickets  # event stream ticket -> user_id, used up when the stream opens
+
+# Session mode: 'stored' (tokens looked up in user_sessions) or 'signed' (HMAC-signed tokens
+# checked without a session lookup, so any worker or node holding SESSION_SECRET can serve them)
+SESSION_MODE = os.getenv('SESSION_MODE', 'stored')
+signed_sessions = None
+if SESSION_MODE == 'signed':
+    session_secret = os.getenv('SESSION_SECRET', '')
+    if not session_secret:
+        print("WARNING: SESSION_SECRET not set. Using a random secret; tokens won't survive a restart or work across workers.")
+        session_secret = uuid.uuid4().hex + uuid.uuid4().hex
+    signed_sessions = SignedSessionTokens(session_secret.encode(), storage.revoked_sessions,
+                                          ttl=timedelta(hours=SESSION_TTL_HOURS))
+elif SESSION_MODE != 'stored':
+    raise ValueError(f"Unknown SESSION_MODE '{SESSION_MODE}' (expected 'stored' or 'signed')")
+profiles = storage.profiles  # user_id -> public profile, refreshed on user/gym info writes
 
 # Email configuration (from environment variables)
 GMAIL_USER = os.getenv('GMAIL_USER', '')
 GMAIL_PASSWORD = os.getenv('GMAIL_PASSWORD', '')  # Use Gmail App Password
 FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:5173')
 
+# Outgoing mail is queued and sent by background workers over pooled SMTP connections
+mailer = create_mailer(
+    GMAIL_USER,
+    GMAIL_PASSWORD,
+    host=os.getenv('SMTP_HOST', 'smtp.gmail.com'),
+    port=int(os.getenv('SMTP_PORT', '587')),
+    starttls=os.getenv('SMTP_STARTTLS', 'true').lower() == 'true',
+    login=os.getenv('SMTP_LOGIN', 'true').lower() == 'true',
+    workers=int(os.getenv('MAIL_WORKERS', '2')),
+    batch_size=int(os.getenv('MAIL_BATCH_SIZE', '20')),
+    max_attempts=int(os.getenv('MAIL_MAX_ATTEMPTS', '3')),
+)
+
+# Match emails are held per recipient for this many seconds and sent as one digest
+match_digests = create_match_digests(mailer, window=float(os.getenv('MATCH_DIGEST_WINDOW', '60')))
+
+# Password hashing: salted scrypt at this cost, run on a bounded pool of hashing threads.
+# Raising the cost is safe; existing hashes are upgraded on the user's next login.
+password_hasher = PasswordHasher(
+    n=int(os.getenv('PASSWORD_SCRYPT_N', str(2 ** 14))),
+    r=int(os.getenv('PASSWORD_SCRYPT_R', '8')),
+    p=int(os.getenv('PASSWORD_SCRYPT_P', '1')),
+    workers=int(os.getenv('PASSWORD_HASH_WORKERS', '4')),
+    max_pending=int(os.getenv('PASSWORD_HASH_MAX_PENDING', '64')),
+)
+
+# Page sizes for list endpoints (/api/posts, /api/profiles, /api/requests)
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Encoded /api/posts and /api/profiles pages, reused until a write changes the underlying store
+feed_cache = ResponseCache(max_entries=int(os.getenv('FEED_CACHE_SIZE', '512')))
+
+# Server-sent event streams (/api/events): events a client may fall behind by before
+# it's disconnected, and how often an idle stream gets a keepalive comment
+event_hub = EventHub(max_pending=int(os.getenv('EVENT_QUEUE_SIZE', '32')))
+EVENT_KEEPALIVE_SECONDS = float(os.getenv('EVENT_KEEPALIVE_SECONDS', '25'))
+EVENT_STREAM_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
 def hash_password(password: str) -> str:
-    """Simple password hashing (use bcrypt in production)"""
-    return hashlib.sha256(password.encode()).hexdigest()
+    """Salted scrypt hash of a password (parameters are stored in the hash)"""
+    return password_hasher.hash(password)
 
 def generate_token() -> str:
     """Generate a simple session token"""
     return str(uuid.uuid4())
 
+def start_session(user_id: str) -> str:
+    """Create a session for a user and return its token"""
+    if signed_sessions:
+        return signed_sessions.issue(user_id)
+    token = generate_token()
+    user_sessions.add(token, user_id)
+    return token
+
+def end_session(token: str) -> None:
+    """Log out one session"""
+    if signed_sessions:
+        signed_sessions.revoke(token)
+    else:
+        user_sessions.remove(token)
+
+def end_user_sessions(user_id: str) -> None:
+    """Log out every session a user has"""
+    if signed_sessions:
+        signed_sessions.revoke_user(user_id)
+    else:
+        user_sessions.remove_for_user(user_id)
+
 def generate_verification_token() -> str:
     """Generate a verification token"""
     return str(uuid.uuid4())
 
+def queue_match_notifications(interest_request: Dict) -> None:
+    """Add an accepted request to both users' pending match digests"""
+    sender = users.get_by_id(interest_request['sender_id'])
+    receiver = users.get_by_id(interest_request['receiver_id'])
+    if not sender or not receiver:
+        return
+    
+    context = ''
+    if interest_request.get('type') == 'post' and interest_request.get('post_id'):
+        post = posts.get(interest_request['post_id'])
+        if post:
+            context = f" for {post.get('title', post.get('workout_type', 'Gym Session'))}"
+    
+    for user, partner in ((sender, receiver), (receiver, sender)):
+        match_digests.add(
+            user['email'],
+            user.get('first_name', ''),
+            f"{partner.get('first_name', '')} {partner.get('last_name', '')}".strip(),
+            partner['email'],
+            context
+        )
+
+def describe_request(interest_request: Dict, user_id: str) -> Dict:
+    """A request as shown in user_id's inbox, with the other user's and the post's details"""
+    request_data = interest_request.copy()
+    if interest_request['receiver_id'] == user_id:
+        # Add sender info
+        sender = users.get_by_id(interest_request['sender_id'])
+        if sender:
+            request_data['sender_name'] = f"{sender.get('first_name', '')} {sender.get('last_name', '')}".strip()
+            request_data['sender_email'] = sender.get('email', '')
+    else:
+        # Add receiver info
+        receiver = users.get_by_id(interest_request['receiver_id'])
+        if receiver:
+            request_data['receiver_name'] = f"{receiver.get('first_name', '')} {receiver.get('last_name', '')}".strip()
+            request_data['receiver_email'] = receiver.get('email', '')
+    
+    # Add post info if it's a post request
+    if interest_request.get('type') == 'post' and interest_request.get('post_id'):
+        post = posts.get(interest_request['post_id'])
+        if post:
+            request_data['post_title'] = post.get('title', post.get('workout_type', 'Gym Session'))
+            request_data['post_date_time'] = post.get('date_time')
+            request_data['post_location'] = post.get('location')
+    return request_data
+
+def in_received_box(interest_request: Dict) -> bool:
+    """Whether a received request is listed (all gym session requests, only pending profile requests)"""
+    return interest_request.get('type') == 'post' or interest_request.get('status') == 'pending'
+
+def publish_request_event(interest_request: Dict) -> None:
+    """Tell both participants' event streams that a request was created or answered"""
+    event = {
+        'request_id': interest_request['id'],
+        'type': interest_request.get('type'),
+        'status': interest_request.get('status'),
+        'version': interest_requests.version,  # /api/requests/changes is current as of this version
+    }
+    for user_id in {interest_request['sender_id'], interest_request['receiver_id']}:
+        event_hub.publish(user_id, 'request', event)
+
+def event_stream_start(user_id: str) -> bytes:
+    """
+    Opening of a user's event stream: the reconnect delay and a ready event with
+    their current verification status. Events may have been missed while the
+    client was disconnected, so on ready it should resync its request inbox.
+    """
+    user = users.get_by_id(user_id)
+    return RETRY + format_event('ready', {'verified': bool(user and user.get('verified', False))})
+
 def send_verification_email(email: str, token: str, first_name: str) -> bool:
-    """Send verification email using Gmail SMTP"""
-    if not GMAIL_USER or not GMAIL_PASSWORD:
+    """Queue a verification email for delivery (returns False if it couldn't be queued)"""
+    if not mailer.configured:
         print("WARNING: Gmail credentials not configured. Email verification disabled.")
         return False
     
     try:
-        # Create message
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = 'Verify your LiftLink account'
-        msg['From'] = GMAIL_USER
-        msg['To'] = email
-        
         # Create verification link
         verification_link = f"{FRONTEND_URL}/verify-email?token={token}"
         
-        # Create email body
-        text = f"""
-        Hi {first_name},
-        
-        Welcome to LiftLink! Please verify your email address by clicking the link below:
-        
-        {verification_link}
-        
-        If you didn't create an account, please ignore this email.
-        
-        Best regards,
-        The LiftLink Team
-        """
-        
-        html = f"""
-        <html>
-          <body>
-            <h2>Hi {first_name},</h2>
-            <p>Welcome to LiftLink! Please verify your email address by clicking the button below:</p>
-            <p><a href="{verification_link}" style="background-color: #4CAF50; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; display: inline-block;">Verify Email</a></p>
-            <p>Or copy and paste this link into your browser:</p>
-            <p>{verification_link}</p>
-            <p>If you didn't create an account, please ignore this email.</p>
-            <p>Best regards,<br>The LiftLink Team</p>
-          </body>
-        </html>
-        """
-        
-        # Attach parts
-        part1 = MIMEText(text, 'plain')
-        part2 = MIMEText(html, 'html')
-        msg.attach(part1)
-        msg.attach(part2)
-        
-        # Send email
-        with smtplib.SMTP('smtp.gmail.com', 587) as server:
-            server.starttls()
-            server.login(GMAIL_USER, GMAIL_PASSWORD)
-            server.send_message(msg)
-        
-        return True
+        # Render from the precompiled template and hand off to the mail queue
+        msg = build_message(VERIFICATION, {
+            'first_name': first_name,
+            'verification_link': verification_link
+        }, sender=GMAIL_USER, to=email)
+        return mailer.send([email], msg)
     except Exception as e:
-        print(f"Error sending verification email: {str(e)}")
+        print(f"Error queueing verification email: {str(e)}")
         return False
 
 # ==================== AUTHENTICATION ENDPOINTS ====================
@@ -159,12 +293,12 @@ def register():
             return jsonify({'error': 'Please use a valid .edu email address'}), 400
         
         # Check if user already exists (case-insensitive)
-        if email in emails:
+        if email in users:
             return jsonify({'error': 'Account already exists'}), 409
         
-        # Create user (unverified by default)
+        # Create user (unverified by default); add_unique also catches a registration racing this one
         user_id = str(uuid.uuid4())
-        emails[email] = {
+        created = users.add_unique({
             'id': user_id,
             'password_hash': hash_password(password),
             'first_name': first_name,
@@ -174,22 +308,20 @@ def register():
             'age': age,
             'verified': False,  # Email not verified yet
             'created_at': datetime.now().isoformat()
-        }
+        })
+        if not created:
+            return jsonify({'error': 'Account already exists'}), 409
+        profiles.refresh(user_id)
         
         # Generate verification token
         verification_token = generate_verification_token()
-        verification_tokens[verification_token] = {
-            'user_id': user_id,
-            'email': email,
-            'created_at': datetime.now().isoformat()
-        }
+        verification_tokens.issue(verification_token, user_id, email)
         
         # Send verification email
         email_sent = send_verification_email(email, verification_token, first_name)
         
         # Generate session token (user can login but may have limited access)
-        token = generate_token()
-        user_sessions[token] = user_id
+        token = start_session(user_id)
         
         return jsonify({
             'message': 'User registered successfully. Please check your email to verify your account.',
@@ -200,6 +332,8 @@ def register():
             'email_sent': email_sent
         }), 201
         
+    except HasherBusy:
+        return jsonify({'error': 'Server is busy, please try again shortly'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -218,39 +352,31 @@ def login():
         if not email_input or not password:
             return jsonify({'error': 'Email and password required'}), 400
         
-        # Normalize email (lowercase) for lookup
-        email_input_lower = email_input.lower().strip()
-        
-        # Check if email exists (case-insensitive)
-        user_data = None
-        user_email_key = None
-        for email_key in emails.keys():
-            if email_key.lower() == email_input_lower:
-                user_data = emails[email_key]
-                user_email_key = email_key
-                break
+        # Look up by normalized email (case-insensitive)
+        user_data = users.get_by_email(email_input)
         
-        if not user_data:
+        # Verify password; an unknown email is checked against a dummy hash so its
+        # response takes as long as a wrong password and doesn't reveal the account is missing
+        if not password_hasher.verify(password, user_data['password_hash'] if user_data else None):
             return jsonify({'error': 'Invalid credentials'}), 401
         
-        password_hash = hash_password(password)
-        
-        # Verify password
-        if user_data['password_hash'] != password_hash:
-            return jsonify({'error': 'Invalid credentials'}), 401
+        # Upgrade legacy or lower-cost hashes now that we have the plaintext
+        if password_hasher.needs_rehash(user_data['password_hash']):
+            users.update(user_data['id'], {'password_hash': hash_password(password)})
         
         # Generate session token
-        token = generate_token()
-        user_sessions[token] = user_data['id']
+        token = start_session(user_data['id'])
         
         return jsonify({
             'message': 'Login successful',
             'token': token,
             'user_id': user_data['id'],
-            'email': user_email_key or email_input,  # Use the actual email key from storage
+            'email': user_data['email'],  # Use the email as stored
             'verified': user_data.get('verified', False)  # Include verification status
         }), 200
         
+    except HasherBusy:
+        return jsonify({'error': 'Server is busy, please try again shortly'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -259,8 +385,8 @@ def logout():
     """Logout user"""
     try:
         token = request.headers.get('Authorization')
-        if token and token in user_sessions:
-            del user_sessions[token]
+        if token:
+            end_session(token)
         return jsonify({'message': 'Logged out successfully'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -279,18 +405,19 @@ def check_verification_status():
             }), 200
         
         # Check if token exists
-        if token not in verification_tokens:
+        verification_data = verification_tokens.get(token)
+        if not verification_data:
             # Token doesn't exist - might be already used or expired
             return jsonify({
                 'message': 'Token not found. It may have already been used or expired.',
                 'token_exists': False
             }), 200
         
-        verification_data = verification_tokens[token]
         email = verification_data['email']
         
         # Check if user is already verified
-        if email in emails and emails[email].get('verified', False):
+        user = users.get_by_email(email)
+        if user and user.get('verified', False):
             return jsonify({
                 'message': 'Email already verified',
                 'verified': True,
@@ -317,22 +444,23 @@ def verify_email():
             return jsonify({'error': 'Verification token required'}), 400
         
         # Check if token exists
-        if token not in verification_tokens:
+        verification_data = verification_tokens.get(token)
+        if not verification_data:
             # Token might have been used already - check if user is already verified
             # Try to find user by checking all users and see if any are verified
             # But we don't have a way to map token to user without the token...
             # So we'll just return the error, but make it more helpful
             return jsonify({'error': 'Invalid or expired verification token. The token may have already been used. If you already verified your email, you can log in normally.'}), 400
         
-        verification_data = verification_tokens[token]
         user_id = verification_data['user_id']
         email = verification_data['email']
         
         # Find user and check if already verified
-        if email in emails:
-            if emails[email].get('verified', False):
+        user = users.get_by_email(email)
+        if user:
+            if user.get('verified', False):
                 # User already verified - remove token and return success
-                del verification_tokens[token]
+                verification_tokens.remove(token)
                 return jsonify({
                     'message': 'Email already verified',
                     'verified': True,
@@ -340,13 +468,16 @@ def verify_email():
                 }), 200
             
             # Mark as verified
-            emails[email]['verified'] = True
-            emails[email]['verified_at'] = datetime.now().isoformat()
+            users.update(user['id'], {
+                'verified': True,
+                'verified_at': datetime.now().isoformat()
+            })
+            event_hub.publish(user['id'], 'verification', {'verified': True})
         else:
             return jsonify({'error': 'User not found'}), 404
         
         # Remove used token
-        del verification_tokens[token]
+        verification_tokens.remove(token)
         
         return jsonify({
             'message': 'Email verified successfully',
@@ -365,28 +496,18 @@ def resend_verification():
             return jsonify({'error': 'Unauthorized'}), 401
         
         # Find user
-        user = None
-        user_email = None
-        for email_addr, u in emails.items():
-            if u['id'] == user_id:
-                user = u
-                user_email = email_addr
-                break
-        
+        user = users.get_by_id(user_id)
         if not user:
             return jsonify({'error': 'User not found'}), 404
+        user_email = user['email']
         
         # Check if already verified
         if user.get('verified', False):
             return jsonify({'error': 'Email already verified'}), 400
         
-        # Generate new verification token
+        # Generate new verification token (the previous one stops working)
         verification_token = generate_verification_token()
-        verification_tokens[verification_token] = {
-            'user_id': user_id,
-            'email': user_email,
-            'created_at': datetime.now().isoformat()
-        }
+        verification_tokens.issue(verification_token, user_id, user_email)
         
         # Send verification email
         email_sent = send_verification_email(
@@ -408,10 +529,153 @@ def resend_verification():
 
 def get_user_from_token() -> Optional[str]:
     """Helper to get user_id from token"""
-    token = request.headers.get('Authorization')
-    if token and token in user_sessions:
-        return user_sessions[token]
-    return None
+    return user_for_token(request.headers.get('Authorization'))
+
+def user_for_token(token: Optional[str]) -> Optional[str]:
+    """user_id for a session token (None if it's missing, expired or revoked)"""
+    if not token:
+        return None
+    if signed_sessions:
+        return signed_sessions.verify(token)
+    return user_sessions.get(token)
+
+def user_for_event_stream(token: Optional[str], ticket: Optional[str]) -> Optional[str]:
+    """
+    user_id opening an event stream: a session token from the Authorization header,
+    or else a stream ticket from the query string, which this uses up. Session tokens
+    are never taken from the URL, where access logs would record them.
+    """
+    if token:
+        return user_for_token(token)
+    return stream_tickets.take(ticket) if ticket else None
+
+# ==================== PAGINATION HELPERS ====================
+
+def encode_cursor(position: Dict) -> str:
+    """Encode a paging position as an opaque URL-safe cursor"""
+    raw = json.dumps(position, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Dict:
+    """Decode a cursor produced by encode_cursor (raises ValueError if it's malformed)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        position = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(position, dict):
+        raise ValueError('Invalid cursor')
+    return position
+
+def get_page_params() -> Tuple[Optional[Dict], int]:
+    """Read the cursor and limit query parameters (raises ValueError if they're invalid)"""
+    limit_arg = request.args.get('limit')
+    if limit_arg is None:
+        limit = DEFAULT_PAGE_SIZE
+    else:
+        try:
+            limit = int(limit_arg)
+        except ValueError:
+            raise ValueError('limit must be a positive integer')
+        if limit < 1:
+            raise ValueError('limit must be a positive integer')
+        limit = min(limit, MAX_PAGE_SIZE)
+    
+    cursor = request.args.get('cursor')
+    return (decode_cursor(cursor) if cursor else None), limit
+
+def page_requests(user_id: str, position: Optional[Dict], box: str, limit: int,
+                  where: Optional[Callable[[Dict], bool]] = None) -> Tuple[List[Dict], Optional[List[str]]]:
+    """
+    One page of a user's request box ('received' or 'sent') in request_sort_key order,
+    keeping only requests that pass where. Returns the page and the key to resume
+    after (None when the box is exhausted).
+    """
+    after = None
+    if position is not None:
+        after = position.get(box)
+        if after is None:
+            return [], None  # Box was exhausted on an earlier page
+        if not (isinstance(after, list) and len(after) == 2 and all(isinstance(k, str) for k in after)):
+            raise ValueError('Invalid cursor')
+        after = tuple(after)
+    
+    page, next_key = interest_requests.page(box, user_id, after, limit, where)
+    return page, list(next_key) if next_key is not None else None
+
+def parse_age_bound(value: Optional[str]) -> Optional[int]:
+    """Age filter bound from a query parameter (ignored if it isn't a number)"""
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+def get_seq_cursor(position: Optional[Dict]) -> Optional[int]:
+    """Sequence number to resume after from a {'after': seq} cursor"""
+    if position is None:
+        return None
+    after = position.get('after')
+    if not isinstance(after, int):
+        raise ValueError('Invalid cursor')
+    return after
+
+def cached_json_response(cache_key: Tuple, versions: Tuple, build):
+    """
+    Serve a JSON response from feed_cache, calling build() -> (encoded body, valid_until)
+    on a miss. versions must be read before building. Sets an ETag and answers a
+    matching If-None-Match with 304.
+    """
+    entry = feed_cache.get(cache_key, versions)
+    if entry is None:
+        body, valid_until = build()
+        entry = feed_cache.put(cache_key, versions, body + b'\n', valid_until)
+    response = app.response_class(entry.body, mimetype='application/json')
+    response.set_etag(entry.etag)
+    response.headers['Cache-Control'] = 'private, no-cache'  # Clients may keep it but must revalidate
+    return response.make_conditional(request)
+
+# ==================== CHANGE FEED HELPERS ====================
+
+def get_since_param() -> Optional[int]:
+    """The since version query parameter (None if absent; raises ValueError if it's invalid)"""
+    since_arg = request.args.get('since')
+    if since_arg is None:
+        return None
+    try:
+        since = int(since_arg)
+    except ValueError:
+        raise ValueError('since must be a version returned by this endpoint')
+    if since < 0:
+        raise ValueError('since must be a version returned by this endpoint')
+    return since
+
+def change_feed_response(key: str, since: Optional[int], changes_since, current_version: int, fetch, snapshot):
+    """
+    Changes to a store after version since, for clients that keep a local copy:
+
+        {"version": V, "reset": false, "changes": [{"op": "insert"|"update", "id": ..., key: record},
+                                                   {"op": "delete", "id": ...}, ...]}
+
+    changes_since(since) -> (changes or None, version) comes from the store's change
+    log, fetch(id) gives a record as this user should see it (None if it's gone or
+    hidden from them). Without since, or when the log can't answer it (too old,
+    or from before a restart), "reset" is true and changes holds every record from
+    snapshot(); the client replaces its copy. Either way it polls again with V.
+    """
+    changes = None
+    if since is not None:
+        changes, current_version = changes_since(since)
+    if changes is None:
+        entries = [{'op': 'insert', 'id': record['id'], key: record} for record in snapshot()]
+    else:
+        entries = []
+        for record_id, op in changes:
+            record = fetch(record_id) if op != 'delete' else None
+            if record is None:
+                entries.append({'op': 'delete', 'id': record_id})
+            else:
+                entries.append({'op': op, 'id': record_id, key: record})
+    return jsonify({'version': current_version, 'reset': changes is None, 'changes': entries}), 200
 
 # ==================== GYM INFO ENDPOINTS ====================
 
@@ -430,27 +694,26 @@ def save_gym_info():
         if not focus or not experience:
             return jsonify({'error': 'Focus and experience are required'}), 400
         
-        # Get existing gym info or create new
-        if user_id not in gym_info:
-            gym_info[user_id] = {}
-        
-        gym_info[user_id].update({
-            'user_id': user_id,
+        changes = {
             'focus': focus,
             'experience': experience,
             'updated_at': datetime.now().isoformat()
-        })
+        }
         
         # Update bio if provided
         bio = data.get('bio')
         if bio is not None:
             if len(bio) > 200:
                 return jsonify({'error': 'Bio must be 200 characters or less'}), 400
-            gym_info[user_id]['bio'] = bio
+            changes['bio'] = bio
+        
+        # Merge into existing gym info (or create it) in one store write
+        user_gym_info = gym_info.update(user_id, changes)
+        profiles.refresh(user_id)
         
         return jsonify({
             'message': 'Gym info saved successfully',
-            'gym_info': gym_info[user_id]
+            'gym_info': user_gym_info
         }), 200
         
     except Exception as e:
@@ -464,8 +727,9 @@ def get_gym_info():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        if user_id in gym_info:
-            return jsonify(gym_info[user_id]), 200
+        user_gym_info = gym_info.get(user_id)
+        if user_gym_info is not None:
+            return jsonify(user_gym_info), 200
         else:
             return jsonify({'message': 'No gym info found'}), 404
             
@@ -497,11 +761,8 @@ def create_post():
             return jsonify({'error': 'Missing required fields'}), 400
         
         # Get user info
-        email = None
-        for u in emails.values():
-            if u['id'] == user_id:
-                email = u['email']
-                break
+        user = users.get_by_id(user_id)
+        email = user['email'] if user else None
         
         post = {
             'id': str(uuid.uuid4()),
@@ -518,7 +779,7 @@ def create_post():
             'created_at': datetime.now().isoformat()
         }
         
-        posts.append(post)
+        post = posts.add(post)
         
         return jsonify({
             'message': 'Post created successfully',
@@ -537,15 +798,17 @@ def get_posts():
             return jsonify({'error': 'Unauthorized'}), 401
         
         # Check if user is verified (PRD requirement: unverified users cannot view posts)
-        current_user = None
-        for u in emails.values():
-            if u['id'] == user_id:
-                current_user = u
-                break
+        current_user = users.get_by_id(user_id)
         
         if not current_user or not current_user.get('verified', False):
             return jsonify({'error': 'Please verify your email to view posts'}), 403
         
+        try:
+            position, limit = get_page_params()
+            after = get_seq_cursor(position)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         # Get filter parameters
         workout_type = request.args.get('workout_type')
         location = request.args.get('location')
@@ -553,35 +816,49 @@ def get_posts():
         gender_preference = request.args.get('gender_preference')
         party_size = request.args.get('party_size')
         
-        # Filter posts
-        filtered_posts = posts.copy()
-        
-        if workout_type:
-            filtered_posts = [p for p in filtered_posts if p['workout_type'].lower() == workout_type.lower()]
-        if location:
-            filtered_posts = [p for p in filtered_posts if location.lower() in p['location'].lower()]
-        if experience_level:
-            filtered_posts = [p for p in filtered_posts if p['experience_level'].lower() == experience_level.lower()]
-        if gender_preference:
-            filtered_posts = [p for p in filtered_posts if p.get('gender_preference', '').lower() == gender_preference.lower() or not p.get('gender_preference')]
-        if party_size:
-            filtered_posts = [p for p in filtered_posts if p['party_size'].lower() == party_size.lower()]
-        
-        # Filter out expired posts (optional - you might want to keep them)
-        now = datetime.now()
-        active_posts = []
-        for post in filtered_posts:
-            try:
-                post_time = datetime.fromisoformat(post['date_time'].replace('Z', '+00:00'))
-                if post_time > now:
-                    active_posts.append(post)
-            except:
-                active_posts.append(post)  # Include if date parsing fails
+        filters = {
+            'workout_type': workout_type,
+            'experience_level': experience_level,
+            'gender_preference': gender_preference,
+            'party_size': party_size,
+        }
         
-        return jsonify({
-            'posts': active_posts,
-            'count': len(active_posts)
-        }), 200
+        def build_page():
+            # Filter posts through the store's indexes (expired sessions are already dropped)
+            filtered_posts, next_after = posts.search(filters, location=location, after=after, limit=limit)
+            # Splice in each post's cached encoding rather than re-encoding the page
+            return dumps_with_fragments({
+                'count': len(filtered_posts),
+                'next_cursor': encode_cursor({'after': next_after}) if next_after is not None else None
+            }, 'posts', posts.encoded(filtered_posts)), posts.next_expiry()  # The page changes when the next upcoming post starts
+        
+        # The feed is the same for every user, so the cache key is just the normalized query
+        cache_key = ('posts', *((value or '').lower() for value in filters.values()),
+                     (location or '').lower(), after, limit)
+        return cached_json_response(cache_key, (posts.version,), build_page)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/posts/changes', methods=['GET'])
+def get_post_changes():
+    """Posts inserted, updated or deleted since a version (see change_feed_response)"""
+    try:
+        user_id = get_user_from_token()
+        if not user_id:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        current_user = users.get_by_id(user_id)
+        if not current_user or not current_user.get('verified', False):
+            return jsonify({'error': 'Please verify your email to view posts'}), 403
+        
+        try:
+            since = get_since_param()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Snapshots hold upcoming posts only; clients drop posts themselves once they start
+        return change_feed_response('post', since, posts.changes, posts.version, posts.get, posts.upcoming)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -594,7 +871,7 @@ def get_post(post_id):
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        post = next((p for p in posts if p['id'] == post_id), None)
+        post = posts.get(post_id)
         if not post:
             return jsonify({'error': 'Post not found'}), 404
         
@@ -611,8 +888,7 @@ def update_post(post_id):
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        global posts
-        post = next((p for p in posts if p['id'] == post_id), None)
+        post = posts.get(post_id)
         if not post:
             return jsonify({'error': 'Post not found'}), 404
         
@@ -621,24 +897,11 @@ def update_post(post_id):
             return jsonify({'error': 'Unauthorized to edit this post'}), 403
         
         data = request.json
-        if 'title' in data:
-            post['title'] = data['title']
-        if 'workout_type' in data:
-            post['workout_type'] = data['workout_type']
-        if 'date_time' in data:
-            post['date_time'] = data['date_time']
-        if 'location' in data:
-            post['location'] = data['location']
-        if 'party_size' in data:
-            post['party_size'] = data['party_size']
-        if 'experience_level' in data:
-            post['experience_level'] = data['experience_level']
-        if 'gender_preference' in data:
-            post['gender_preference'] = data['gender_preference']
-        if 'notes' in data:
-            post['notes'] = data['notes']
-        
-        post['updated_at'] = datetime.now().isoformat()
+        editable_fields = ('title', 'workout_type', 'date_time', 'location', 'party_size',
+                           'experience_level', 'gender_preference', 'notes')
+        changes = {field: data[field] for field in editable_fields if field in data}
+        changes['updated_at'] = datetime.now().isoformat()
+        post = posts.update(post_id, changes)
         
         return jsonify({
             'message': 'Post updated successfully',
@@ -656,8 +919,7 @@ def delete_post(post_id):
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        global posts
-        post = next((p for p in posts if p['id'] == post_id), None)
+        post = posts.get(post_id)
         if not post:
             return jsonify({'error': 'Post not found'}), 404
         
@@ -665,7 +927,7 @@ def delete_post(post_id):
         if post['user_id'] != user_id:
             return jsonify({'error': 'Unauthorized to delete this post'}), 403
         
-        posts = [p for p in posts if p['id'] != post_id]
+        posts.remove(post_id)
         return jsonify({'message': 'Post deleted successfully'}), 200
         
     except Exception as e:
@@ -679,11 +941,9 @@ def get_my_posts():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        my_posts = [p for p in posts if p['user_id'] == user_id]
-        return jsonify({
-            'posts': my_posts,
-            'count': len(my_posts)
-        }), 200
+        my_posts = posts.by_user(user_id)
+        body = dumps_with_fragments({'count': len(my_posts)}, 'posts', posts.encoded(my_posts))
+        return app.response_class(body + b'\n', mimetype='application/json'), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -699,18 +959,14 @@ def get_user():
             return jsonify({'error': 'Unauthorized'}), 401
         
         # Find user
-        user = None
-        for u in emails.values():
-            if u['id'] == user_id:
-                user = u.copy()
-                del user['password_hash']  # Don't return password
-                break
-        
+        user = users.get_by_id(user_id)
         if not user:
             return jsonify({'error': 'User not found'}), 404
+        user = user.copy()
+        del user['password_hash']  # Don't return password
         
         # Add gym info and bio
-        user_gym_info = gym_info.get(user_id, {})
+        user_gym_info = gym_info.get(user_id) or {}
         user['bio'] = user_gym_info.get('bio', '')
         user['focus'] = user_gym_info.get('focus')
         user['experience'] = user_gym_info.get('experience')
@@ -732,37 +988,23 @@ def update_user():
         data = request.json
         
         # Find user
-        user = None
-        user_email = None
-        for email_addr, u in emails.items():
-            if u['id'] == user_id:
-                user = u
-                user_email = email_addr
-                break
-        
+        user = users.get_by_id(user_id)
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
         # Update allowed fields
-        if 'first_name' in data:
-            user['first_name'] = data['first_name']
-        if 'last_name' in data:
-            user['last_name'] = data['last_name']
-        if 'gender' in data:
-            user['gender'] = data['gender']
-        if 'age' in data:
-            user['age'] = data['age']
+        changes = {field: data[field] for field in ('first_name', 'last_name', 'gender', 'age') if field in data}
         
         # Update bio in gym_info
         if 'bio' in data:
             bio = data['bio']
             if len(bio) > 200:
                 return jsonify({'error': 'Bio must be 200 characters or less'}), 400
-            if user_id not in gym_info:
-                gym_info[user_id] = {}
-            gym_info[user_id]['bio'] = bio
+            gym_info.update(user_id, {'bio': bio})
         
-        user['updated_at'] = datetime.now().isoformat()
+        changes['updated_at'] = datetime.now().isoformat()
+        user = users.update(user_id, changes)
+        profiles.refresh(user_id)
         
         return jsonify({
             'message': 'User updated successfully',
@@ -780,32 +1022,22 @@ def delete_account():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        # Find and remove user
-        user_email = None
-        for email_addr, u in emails.items():
-            if u['id'] == user_id:
-                user_email = email_addr
-                break
-        
-        if user_email:
-            del emails[user_email]
+        # Remove user and their profile
+        users.remove(user_id)
+        profiles.remove(user_id)
         
         # Remove gym info
-        if user_id in gym_info:
-            del gym_info[user_id]
+        gym_info.remove(user_id)
         
         # Remove user's posts
-        global posts
-        posts = [p for p in posts if p['user_id'] != user_id]
+        posts.remove_by_user(user_id)
         
         # Remove user's interest requests
-        global interest_requests
-        interest_requests = [r for r in interest_requests if r['sender_id'] != user_id and r['receiver_id'] != user_id]
+        interest_requests.remove_for_user(user_id)
         
         # Remove user sessions
-        tokens_to_remove = [token for token, uid in user_sessions.items() if uid == user_id]
-        for token in tokens_to_remove:
-            del user_sessions[token]
+        end_user_sessions(user_id)
+        verification_tokens.remove_for_user(user_id)
         
         return jsonify({'message': 'Account deleted successfully'}), 200
         
@@ -823,80 +1055,74 @@ def get_profiles():
             return jsonify({'error': 'Unauthorized'}), 401
         
         # Check if user is verified (PRD requirement: unverified users cannot view profiles)
-        current_user = None
-        for u in emails.values():
-            if u['id'] == user_id:
-                current_user = u
-                break
+        current_user = users.get_by_id(user_id)
         
         if not current_user or not current_user.get('verified', False):
             return jsonify({'error': 'Please verify your email to view profiles'}), 403
         
+        try:
+            position, limit = get_page_params()
+            after = get_seq_cursor(position)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         # Get filter parameters
         gender = request.args.get('gender')
         experience_level = request.args.get('experience_level')
         focus = request.args.get('focus')
-        age_min = request.args.get('age_min')
-        age_max = request.args.get('age_max')
+        age_min = parse_age_bound(request.args.get('age_min'))
+        age_max = parse_age_bound(request.args.get('age_max'))
         same_gender_only = request.args.get('same_gender_only', 'false').lower() == 'true'
         
         # Get current user's gender for same-gender filter
         current_user_gender = None
         if same_gender_only:
-            for email_addr, user_data in emails.items():
-                if user_data['id'] == user_id:
-                    current_user_gender = user_data.get('gender')
-                    break
-        
-        # Build profiles from emails data (users stored by email)
-        profiles_list = []
-        for email_addr, user_data in emails.items():
-            # Skip current user
-            if user_data['id'] == user_id:
-                continue
-            
-            # Get user's gym info if available
-            user_gym_info = gym_info.get(user_data['id'], {})
-            
-            profile = {
-                'id': user_data['id'],
-                'username': email_addr.split('@')[0],  # Use email prefix as username
-                'first_name': user_data.get('first_name', ''),
-                'last_name': user_data.get('last_name', ''),
-                'gender': user_data.get('gender'),
-                'age': user_data.get('age'),
-                'experience_level': user_gym_info.get('experience'),
-                'focus': user_gym_info.get('focus'),
-                'bio': user_gym_info.get('bio', ''),
-            }
-            
-            # Apply filters
-            if gender and profile['gender'] and profile['gender'] != gender:
-                continue
-            if same_gender_only and current_user_gender and profile['gender'] != current_user_gender:
-                continue
-            if experience_level and profile['experience_level'] and profile['experience_level'] != experience_level:
-                continue
-            if focus and profile['focus'] and profile['focus'] != focus:
-                continue
-            # Age range filter
-            if age_min or age_max:
-                try:
-                    profile_age = int(profile['age']) if profile['age'] else None
-                    if profile_age:
-                        if age_min and profile_age < int(age_min):
-                            continue
-                        if age_max and profile_age > int(age_max):
-                            continue
-                except:
-                    pass  # Skip age filter if age is not a number
-            
-            profiles_list.append(profile)
+            current_user_gender = current_user.get('gender')
+        
+        def build_page():
+            # Answer from the materialized profiles and their facet/age indexes (skipping current user)
+            profiles_list, next_after = profiles.search({
+                'gender': gender,
+                'experience_level': experience_level,
+                'focus': focus,
+            }, same_gender_as=current_user_gender, age_min=age_min, age_max=age_max,
+                exclude_id=user_id, after=after, limit=limit)
+            return dumps_with_fragments({
+                'count': len(profiles_list),
+                'next_cursor': encode_cursor({'after': next_after}) if next_after is not None else None
+            }, 'profiles', profiles.encoded(profiles_list)), None
+        
+        cache_key = ('profiles', user_id, gender, experience_level, focus, age_min, age_max,
+                     current_user_gender, after, limit)
+        return cached_json_response(cache_key, (profiles.version,), build_page)
         
-        return jsonify({
-            'profiles': profiles_list,
-            'count': len(profiles_list)
-        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/profiles/changes', methods=['GET'])
+def get_profile_changes():
+    """Profiles inserted, updated or deleted since a version (see change_feed_response)"""
+    try:
+        user_id = get_user_from_token()
+        if not user_id:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        current_user = users.get_by_id(user_id)
+        if not current_user or not current_user.get('verified', False):
+            return jsonify({'error': 'Please verify your email to view profiles'}), 403
+        
+        try:
+            since = get_since_param()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        def fetch(profile_id):
+            return profiles.get(profile_id) if profile_id != user_id else None
+        
+        def snapshot():
+            return profiles.search({}, exclude_id=user_id)[0]
+        
+        return change_feed_response('profile', since, profiles.changes, profiles.version, fetch, snapshot)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -909,31 +1135,10 @@ def get_profile(profile_id):
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        # Find user
-        user = None
-        for u in emails.values():
-            if u['id'] == profile_id:
-                user = u
-                break
-        
-        if not user:
+        profile = profiles.get(profile_id)
+        if not profile:
             return jsonify({'error': 'Profile not found'}), 404
         
-        # Get gym info
-        user_gym_info = gym_info.get(profile_id, {})
-        
-        profile = {
-            'id': user['id'],
-            'username': user.get('username', ''),
-            'first_name': user.get('first_name', ''),
-            'last_name': user.get('last_name', ''),
-            'gender': user.get('gender'),
-            'age': user.get('age'),
-            'experience_level': user_gym_info.get('experience'),
-            'focus': user_gym_info.get('focus'),
-            'bio': user_gym_info.get('bio', ''),
-        }
-        
         return jsonify(profile), 200
         
     except Exception as e:
@@ -956,12 +1161,7 @@ def express_interest():
         if profile_id == user_id:
             return jsonify({'error': 'Cannot express interest in your own profile'}), 400
         
-        # Check if request already exists
-        existing = next((r for r in interest_requests if r['sender_id'] == user_id and r['receiver_id'] == profile_id and r['type'] == 'profile'), None)
-        if existing:
-            return jsonify({'error': 'Interest already expressed'}), 409
-        
-        # Create interest request
+        # Create interest request (unless the same one already exists)
         request_id = str(uuid.uuid4())
         interest_request = {
             'id': request_id,
@@ -971,7 +1171,9 @@ def express_interest():
             'status': 'pending',
             'created_at': datetime.now().isoformat()
         }
-        interest_requests.append(interest_request)
+        if not interest_requests.add_unique(interest_request):
+            return jsonify({'error': 'Interest already expressed'}), 409
+        publish_request_event(interest_request)
         
         return jsonify({
             'message': 'Interest expressed successfully',
@@ -1002,7 +1204,7 @@ def request_to_join(post_id):
         if not post_id:
             return jsonify({'error': 'Post ID required'}), 400
         
-        post = next((p for p in posts if p['id'] == post_id), None)
+        post = posts.get(post_id)
         
         if not post:
             return jsonify({'error': 'Post not found'}), 404
@@ -1010,12 +1212,7 @@ def request_to_join(post_id):
         if post['user_id'] == user_id:
             return jsonify({'error': 'Cannot request to join your own post'}), 400
         
-        # Check if request already exists (check by post_id in the request)
-        existing = next((r for r in interest_requests if r['sender_id'] == user_id and r.get('post_id') == post_id and r['type'] == 'post'), None)
-        if existing:
-            return jsonify({'error': 'Request already sent'}), 409
-        
-        # Create join request
+        # Create join request (unless the same one already exists)
         request_id = str(uuid.uuid4())
         interest_request = {
             'id': request_id,
@@ -1026,7 +1223,9 @@ def request_to_join(post_id):
             'status': 'pending',
             'created_at': datetime.now().isoformat()
         }
-        interest_requests.append(interest_request)
+        if not interest_requests.add_unique(interest_request):
+            return jsonify({'error': 'Request already sent'}), 409
+        publish_request_event(interest_request)
         
         return jsonify({
             'message': 'Request to join sent successfully',
@@ -1045,66 +1244,66 @@ def get_requests():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        # Get requests where user is the receiver (all statuses for gym sessions)
-        received_requests = []
-        for r in interest_requests:
-            if r['receiver_id'] == user_id:
-                # For post requests, include all statuses; for profile requests, only pending
-                if r.get('type') == 'post' or r.get('status') == 'pending':
-                    request_data = r.copy()
-                    # Add sender info
-                    sender = None
-                    for u in emails.values():
-                        if u['id'] == r['sender_id']:
-                            sender = u
-                            break
-                    if sender:
-                        request_data['sender_name'] = f"{sender.get('first_name', '')} {sender.get('last_name', '')}".strip()
-                        request_data['sender_email'] = sender.get('email', '')
-                    
-                    # Add post info if it's a post request
-                    if r.get('type') == 'post' and r.get('post_id'):
-                        post = next((p for p in posts if p['id'] == r['post_id']), None)
-                        if post:
-                            request_data['post_title'] = post.get('title', post.get('workout_type', 'Gym Session'))
-                            request_data['post_date_time'] = post.get('date_time')
-                            request_data['post_location'] = post.get('location')
-                    
-                    received_requests.append(request_data)
-        
-        # Get requests where user is the sender
-        sent_requests = []
-        for r in interest_requests:
-            if r['sender_id'] == user_id:
-                request_data = r.copy()
-                # Add receiver info
-                receiver = None
-                for u in emails.values():
-                    if u['id'] == r['receiver_id']:
-                        receiver = u
-                        break
-                if receiver:
-                    request_data['receiver_name'] = f"{receiver.get('first_name', '')} {receiver.get('last_name', '')}".strip()
-                    request_data['receiver_email'] = receiver.get('email', '')
-                
-                # Add post info if it's a post request
-                if r.get('type') == 'post' and r.get('post_id'):
-                    post = next((p for p in posts if p['id'] == r['post_id']), None)
-                    if post:
-                        request_data['post_title'] = post.get('title', post.get('workout_type', 'Gym Session'))
-                        request_data['post_date_time'] = post.get('date_time')
-                        request_data['post_location'] = post.get('location')
-                
-                sent_requests.append(request_data)
+        # Both boxes page independently; the cursor carries a position for each
+        try:
+            position, limit = get_page_params()
+            # Requests where user is the receiver
+            received_page, received_next = page_requests(user_id, position, 'received', limit, in_received_box)
+            # Requests where user is the sender
+            sent_page, sent_next = page_requests(user_id, position, 'sent', limit)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        received_requests = [describe_request(r, user_id) for r in received_page]
+        sent_requests = [describe_request(r, user_id) for r in sent_page]
+        
+        next_position = {}
+        if received_next is not None:
+            next_position['received'] = received_next
+        if sent_next is not None:
+            next_position['sent'] = sent_next
         
         return jsonify({
             'received': received_requests,
-            'sent': sent_requests
+            'sent': sent_requests,
+            'next_cursor': encode_cursor(next_position) if next_position else None
         }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/requests/changes', methods=['GET'])
+def get_request_changes():
+    """The current user's requests inserted, updated or deleted since a version (see change_feed_response)"""
+    try:
+        user_id = get_user_from_token()
+        if not user_id:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        try:
+            since = get_since_param()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        def visible(interest_request: Dict) -> bool:
+            return interest_request['sender_id'] == user_id or in_received_box(interest_request)
+        
+        def fetch(request_id):
+            interest_request = interest_requests.get(request_id)
+            if interest_request is None or not visible(interest_request):
+                return None
+            return describe_request(interest_request, user_id)
+        
+        def snapshot():
+            received = [r for r in interest_requests.received(user_id) if in_received_box(r)]
+            return [describe_request(r, user_id) for r in received + interest_requests.sent(user_id)]
+        
+        return change_feed_response('request', since, lambda v: interest_requests.changes(v, user_id),
+                                    interest_requests.version, fetch, snapshot)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/requests/<request_id>/respond', methods=['POST', 'OPTIONS'])
 def respond_to_request(request_id):
     """Respond to an interest/join request (accept or reject)"""
@@ -1131,7 +1330,7 @@ def respond_to_request(request_id):
         if not request_id:
             return jsonify({'error': 'Request ID required'}), 400
         
-        interest_request = next((r for r in interest_requests if r['id'] == request_id), None)
+        interest_request = interest_requests.get(request_id)
         
         if not interest_request:
             return jsonify({'error': 'Request not found'}), 404
@@ -1143,23 +1342,15 @@ def respond_to_request(request_id):
             return jsonify({'error': 'Request already responded to'}), 400
         
         # Update request status
-        interest_request['status'] = 'accepted' if response_action == 'accept' else 'rejected'
-        interest_request['responded_at'] = datetime.now().isoformat()
+        interest_request = interest_requests.update(request_id, {
+            'status': 'accepted' if response_action == 'accept' else 'rejected',
+            'responded_at': datetime.now().isoformat()
+        })
+        publish_request_event(interest_request)
         
-        # TODO: Send email notification if accepted
+        # Notify both users; accepts arriving close together are sent as one digest
         if response_action == 'accept':
-            # Get sender and receiver emails for notification
-            sender_email = None
-            receiver_email = None
-            for u in emails.values():
-                if u['id'] == interest_request['sender_id']:
-                    sender_email = u['email']
-                if u['id'] == interest_request['receiver_id']:
-                    receiver_email = u['email']
-            
-            # TODO: Implement email sending (SendGrid, Resend, etc.)
-            # For MVP, just log that notification would be sent
-            print(f"TODO: Send email to {sender_email} and {receiver_email} about match")
+            queue_match_notifications(interest_request)
         
         return jsonify({
             'message': f'Request {response_action}ed successfully',
@@ -1169,6 +1360,55 @@ def respond_to_request(request_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# ==================== EVENT STREAM ====================
+
+@app.route('/api/events/ticket', methods=['POST'])
+def create_event_ticket():
+    """
+    Single-use ticket for opening an event stream. EventSource can't set headers,
+    so browsers pass this as ?ticket= instead of putting the session token in the URL.
+    """
+    try:
+        user_id = get_user_from_token()
+        if not user_id:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        ticket = generate_token()
+        stream_tickets.add(ticket, user_id)
+        return jsonify({'ticket': ticket, 'expires_in': EVENT_TICKET_TTL_SECONDS}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/events', methods=['GET'])
+def event_stream():
+    """
+    Server-sent events for the current user (see events.py), authorized by the
+    Authorization header or a ?ticket= from /api/events/ticket. serve.py answers
+    this path on its event loop instead; this route holds a request thread per
+    stream, which is fine for the development server.
+    """
+    user_id = user_for_event_stream(request.headers.get('Authorization'), request.args.get('ticket'))
+    if not user_id:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    # Subscribe before reading the current state so nothing in between is missed
+    subscription = event_hub.open(user_id)
+    start = event_stream_start(user_id)
+    
+    def stream():
+        yield start
+        while True:
+            message = subscription.next(EVENT_KEEPALIVE_SECONDS)
+            if message is None:
+                return  # Fell too far behind; the client reconnects and resyncs
+            yield message
+    
+    response = app.response_class(stream(), mimetype='text/event-stream', headers=EVENT_STREAM_HEADERS)
+    # The server closes the response when the client goes away, even if the stream never started
+    response.call_on_close(lambda: event_hub.close(subscription))
+    return response
+
 # ==================== HEALTH CHECK ====================
 
 @app.route('/api/health', methods=['GET'])
@@ -1185,15 +1425,18 @@ def health_check():
 def reset_database():
     """Reset all in-memory data (development only)"""
     try:
-        global emails, user_sessions, gym_info, posts, interest_requests, verification_tokens
+        global users, user_sessions, gym_info, posts, interest_requests, verification_tokens
         
         # Clear all data
-        emails.clear()
+        users.clear()
         user_sessions.clear()
+        storage.revoked_sessions.clear()
         gym_info.clear()
         posts.clear()
         interest_requests.clear()
         verification_tokens.clear()
+        stream_tickets.clear()
+        profiles.clear()
         
         return jsonify({
             'message': 'Database reset successfully',
@@ -1212,13 +1455,14 @@ def reset_options():
 def seed_database():
     """Seed database with mock data (development only)"""
     try:
-        global emails, gym_info, posts, interest_requests
+        global users, gym_info, posts, interest_requests
         
         # Clear existing data first
-        emails.clear()
+        users.clear()
         gym_info.clear()
         posts.clear()
         interest_requests.clear()
+        profiles.clear()
         
         # Mock users
         mock_users = [
@@ -1279,9 +1523,9 @@ def seed_database():
             },
         ]
         
-        # Add users to emails dict
+        # Add users to the user store
         for user in mock_users:
-            emails[user['email']] = user
+            users.add(user)
         
         # Mock gym info
         gym_info_data = {
@@ -1316,7 +1560,11 @@ def seed_database():
         }
         
         for user_id, info in gym_info_data.items():
-            gym_info[user_id] = info
+            gym_info.update(user_id, info)
+        
+        # Build profiles now that user and gym info are both loaded
+        for user in mock_users:
+            profiles.refresh(user['id'])
         
         # Mock posts
         now = datetime.now()
@@ -1380,7 +1628,8 @@ def seed_database():
             },
         ]
         
-        posts.extend(mock_posts)
+        for post in mock_posts:
+            posts.add(post)
         
         # Mock interest requests
         mock_requests = [
@@ -1439,7 +1688,8 @@ def seed_database():
             },
         ]
         
-        interest_requests.extend(mock_requests)
+        for interest_request in mock_requests:
+            interest_requests.add(interest_request)
         
         return jsonify({
             'message': 'Database seeded successfully',
@@ -1460,5 +1710,8 @@ def seed_options():
 if __name__ == '__main__':
     print("Starting LiftLink Backend Server...")
     print("API endpoints available at http://localhost:5001/api/")
-    print("⚠️  WARNING: Using in-memory storage. Data will be lost on server restart.")
+    if storage.engine == 'memory':
+        print("⚠️  WARNING: Using in-memory storage. Data will be lost on server restart.")
+    else:
+        print(f"Using {storage.engine} storage at {SQLITE_PATH}")
     app.run(debug=True, port=5001)
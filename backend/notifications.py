@@ -0,0 +1,91 @@
+"""
+Match notifications.
+
+Accepted requests are not emailed one by one. Each recipient's matches are
+collected for a short window (starting at their first pending match) and then
+sent as a single digest through the shared mail queue, so a popular post
+getting many accepts at once produces one email per person, not one per accept.
+"""
+import atexit
+import heapq
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from email_templates import MATCH, build_message, render_match_items
+from mailer import Mailer
+
+
+class MatchDigestQueue:
+    """Coalesces match notifications per recipient and sends them as digests"""
+
+    def __init__(self, mailer: Mailer, window: float = 60.0):
+        self.mailer = mailer
+        self.window = window
+        self._pending: Dict[str, Dict] = {}  # email -> {'first_name', 'matches'}
+        self._due: List[Tuple[float, str]] = []  # (send at, email), one entry per pending digest
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def add(self, email: str, first_name: str, partner_name: str, partner_email: str, context: str = '') -> bool:
+        """Queue one match for a recipient's next digest. Returns False if email isn't configured."""
+        if not self.mailer.configured or not email:
+            return False
+        match = {'partner_name': partner_name, 'partner_email': partner_email, 'context': context}
+        with self._cond:
+            digest = self._pending.get(email)
+            if digest is None:
+                self._pending[email] = {'first_name': first_name, 'matches': [match]}
+                heapq.heappush(self._due, (time.monotonic() + self.window, email))
+                self._cond.notify()
+            else:
+                digest['matches'].append(match)
+            self._ensure_started()
+        return True
+
+    def flush(self) -> None:
+        """Send every pending digest now"""
+        with self._cond:
+            pending, self._pending = self._pending, {}
+            self._due = []
+        for email, digest in pending.items():
+            self._send(email, digest)
+
+    def _ensure_started(self) -> None:
+        # Called with the condition held
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='match-digests', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._due or self._due[0][0] > time.monotonic():
+                    timeout = self._due[0][0] - time.monotonic() if self._due else None
+                    self._cond.wait(timeout)
+                _, email = heapq.heappop(self._due)
+                digest = self._pending.pop(email, None)
+            if digest is not None:
+                self._send(email, digest)
+
+    def _send(self, email: str, digest: Dict) -> None:
+        matches = digest['matches']
+        headline = (f"You matched with {matches[0]['partner_name']}" if len(matches) == 1
+                    else f"You have {len(matches)} new matches")
+        try:
+            msg = build_message(MATCH, {
+                'first_name': digest['first_name'],
+                'headline': headline,
+                **render_match_items(matches),
+            }, sender=self.mailer.sender, to=email)
+            self.mailer.send([email], msg)
+        except Exception as e:
+            print(f"Error queueing match digest for {email}: {str(e)}")
+
+
+def create_match_digests(mailer: Mailer, window: float = 60.0) -> MatchDigestQueue:
+    """Build a digest queue whose pending digests are handed to the mailer at exit"""
+    digests = MatchDigestQueue(mailer, window)
+    # Registered after the mailer's own hook, so it runs first and the mailer can still deliver
+    atexit.register(digests.flush)
+    return digests
@@ -0,0 +1,112 @@
+"""
+Password hashing.
+
+Passwords are hashed with salted scrypt. The cost parameters are stored in the
+hash itself:
+
+    scrypt$<n>$<r>$<p>$<salt>$<hash>      (salt and hash base64-encoded)
+
+so the cost can be raised later without breaking existing accounts. A hash made
+with other parameters (or a legacy unsalted SHA-256 hex digest) still verifies,
+and needs_rehash() tells the login handler to store a fresh one. Verifying
+against no hash at all (an unknown account) costs the same as a wrong password.
+
+scrypt is deliberately slow and memory-hungry, so hashing runs on a small fixed
+pool of threads (hashlib releases the GIL while it works). A burst of logins
+queues for that pool instead of occupying every request thread, and once the
+queue is full further attempts are turned away with HasherBusy.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+SCRYPT_PREFIX = 'scrypt'
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+
+class HasherBusy(Exception):
+    """Raised when too many hash jobs are already queued"""
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    # scrypt needs about 128 * n * r bytes; leave headroom over OpenSSL's 32 MiB default
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r + 1024 * 1024, dklen=HASH_BYTES)
+
+
+def parse_hash(stored: str) -> Optional[Tuple[int, int, int, bytes, bytes]]:
+    """(n, r, p, salt, hash) of a scrypt hash, or None for any other format"""
+    parts = stored.split('$')
+    if len(parts) != 6 or parts[0] != SCRYPT_PREFIX:
+        return None
+    try:
+        return (int(parts[1]), int(parts[2]), int(parts[3]),
+                base64.b64decode(parts[4]), base64.b64decode(parts[5]))
+    except ValueError:
+        return None
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords on a bounded thread pool"""
+
+    def __init__(self, n: int = 2 ** 14, r: int = 8, p: int = 1, workers: int = 4, max_pending: int = 64):
+        self.n = n
+        self.r = r
+        self.p = p
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        # Slots for running plus queued jobs; a request that can't get one is rejected instead of waiting
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._dummy_hash: Optional[str] = None  # checked in place of a missing account's hash
+
+    def hash(self, password: str) -> str:
+        """A new salted hash of password at the current cost"""
+        return self._run(self._hash, password)
+
+    def verify(self, password: str, stored: Optional[str]) -> bool:
+        """
+        Whether password matches a stored hash (scrypt at any cost, or legacy SHA-256).
+        With no stored hash it checks a dummy one and returns False, so a login for an
+        unknown email takes as long as one with a wrong password.
+        """
+        return self._run(self._verify, password, stored)
+
+    def needs_rehash(self, stored: str) -> bool:
+        """Whether a stored hash should be replaced with one at the current cost"""
+        params = parse_hash(stored)
+        return params is None or params[:3] != (self.n, self.r, self.p)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy('Too many password checks in progress')
+        try:
+            return self._pool.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def _hash(self, password: str) -> str:
+        salt = os.urandom(SALT_BYTES)
+        digest = _scrypt(password, salt, self.n, self.r, self.p)
+        return '$'.join([SCRYPT_PREFIX, str(self.n), str(self.r), str(self.p),
+                         base64.b64encode(salt).decode(), base64.b64encode(digest).decode()])
+
+    def _verify(self, password: str, stored: Optional[str]) -> bool:
+        if stored is None:
+            if self._dummy_hash is None:
+                self._dummy_hash = self._hash(os.urandom(SALT_BYTES).hex())
+            self._verify(password, self._dummy_hash)
+            return False
+        params = parse_hash(stored)
+        if params is None:
+            # Legacy unsalted SHA-256 hex digest
+            return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+        n, r, p, salt, digest = params
+        return hmac.compare_digest(_scrypt(password, salt, n, r, p), digest)
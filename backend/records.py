@@ -0,0 +1,135 @@
+"""
+Compact record types for the in-memory stores.
+
+Users, posts, interest requests and gym info used to be held as plain dicts,
+each carrying its own hash table of key strings and ISO timestamp strings. The
+stores now keep them as __slots__ records instead:
+
+- every known field is a slot, so a record is a small fixed-size object;
+- server-written timestamps (created_at, updated_at, ...) are parsed once into
+  datetimes and format back to the same ISO strings;
+- enum-like values (workout_type, status, ...) are interned, so all records
+  with the same value share one string.
+
+Records still read like the dicts they replace (record['title'],
+record.get('notes'), {**record}), so handlers don't care which engine they got
+a record from. They're immutable in practice: stores build a new record for
+every update. At the JSON boundary to_dict() turns datetimes back into ISO
+strings (fast_json calls it when encoding a record). Unknown fields are kept
+in a small overflow dict, so nothing a client sent is lost.
+"""
+import sys
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Dict, FrozenSet, Iterator, Optional
+
+
+def parse_timestamp(value):
+    """datetime for an ISO timestamp string; anything else (e.g. unparseable text) is kept as it is"""
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    return value
+
+
+class Record(Mapping):
+    """Slotted record that reads like a dict of its set fields"""
+
+    __slots__ = ('_extra',)
+    TIME_FIELDS: FrozenSet[str] = frozenset()
+    INTERNED_FIELDS: FrozenSet[str] = frozenset()
+    _fields: FrozenSet[str] = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._fields = frozenset(cls.__slots__)
+
+    def __init__(self, data: Mapping):
+        extra: Optional[Dict] = None
+        for key, value in data.items():
+            if key in self._fields:
+                if key in self.TIME_FIELDS:
+                    value = parse_timestamp(value)
+                elif key in self.INTERNED_FIELDS and isinstance(value, str):
+                    value = sys.intern(value)
+                setattr(self, key, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        self._extra = extra
+
+    @classmethod
+    def from_dict(cls, data: Mapping) -> 'Record':
+        """A record of this type for data (returned as is if it already is one)"""
+        return data if type(data) is cls else cls(data)
+
+    def __getitem__(self, key: str):
+        if key in self._fields:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def get(self, key: str, default=None):
+        if key in self._fields:
+            return getattr(self, key, default)
+        return self._extra.get(key, default) if self._extra is not None else default
+
+    def __contains__(self, key) -> bool:
+        if key in self._fields:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self) -> Iterator[str]:
+        for field in self.__slots__:
+            if hasattr(self, field):
+                yield field
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def copy(self) -> Dict:
+        """Mutable dict of the record's fields (timestamps stay datetimes)"""
+        return dict(self.items())
+
+    def to_dict(self) -> Dict:
+        """JSON-ready dict of the record's fields"""
+        return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in self.items()}
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.to_dict()!r})'
+
+
+class User(Record):
+    __slots__ = ('id', 'email', 'password_hash', 'first_name', 'last_name', 'gender', 'age',
+                 'verified', 'verified_at', 'created_at', 'updated_at')
+    TIME_FIELDS = frozenset({'verified_at', 'created_at', 'updated_at'})
+    INTERNED_FIELDS = frozenset({'gender'})
+
+
+class Post(Record):
+    __slots__ = ('id', 'user_id', 'username', 'title', 'workout_type', 'date_time', 'location', 'party_size',
+                 'experience_level', 'gender_preference', 'notes', 'created_at', 'updated_at')
+    # date_time is kept as the client sent it (the store parses start times separately)
+    TIME_FIELDS = frozenset({'created_at', 'updated_at'})
+    INTERNED_FIELDS = frozenset({'workout_type', 'party_size', 'experience_level', 'gender_preference'})
+
+
+class InterestRequest(Record):
+    __slots__ = ('id', 'sender_id', 'receiver_id', 'post_id', 'type', 'status', 'created_at', 'responded_at')
+    TIME_FIELDS = frozenset({'created_at', 'responded_at'})
+    INTERNED_FIELDS = frozenset({'type', 'status'})
+
+
+class GymInfo(Record):
+    __slots__ = ('user_id', 'focus', 'experience', 'bio', 'updated_at')
+    TIME_FIELDS = frozenset({'updated_at'})
+    INTERNED_FIELDS = frozenset({'focus', 'experience'})
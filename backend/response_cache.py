@@ -0,0 +1,71 @@
+"""
+Cache of encoded JSON responses for the feed endpoints.
+
+Entries are keyed by the normalized request (filters, page position) and tagged
+with the version counters of the stores the response was built from. A write
+to any of those stores bumps its version, so the next lookup misses and the
+response is rebuilt; nothing has to be invalidated explicitly. An entry can
+also carry a time after which it's stale regardless (e.g. when the next post
+in a feed starts and drops out of it). The least recently used entries are
+evicted once the cache is full.
+
+Each entry keeps the encoded body and its ETag, so a hit skips both building
+and serializing the response, and a matching If-None-Match gets a 304.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Hashable, Optional, Tuple
+
+
+class CachedResponse:
+    """An encoded response body and what it was built from"""
+
+    __slots__ = ('body', 'etag', 'versions', 'valid_until')
+
+    def __init__(self, body: bytes, versions: Tuple, valid_until: Optional[datetime]):
+        self.body = body
+        self.etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+        self.versions = versions
+        self.valid_until = valid_until
+
+
+class ResponseCache:
+    """LRU map of request key -> CachedResponse, checked against store versions"""
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, versions: Tuple, now: Optional[datetime] = None) -> Optional[CachedResponse]:
+        """The cached response for key, if it was built at these store versions and hasn't expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.versions != versions or (entry.valid_until is not None
+                                              and entry.valid_until <= (now or datetime.now())):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Hashable, versions: Tuple, body: bytes,
+            valid_until: Optional[datetime] = None) -> CachedResponse:
+        """Store a response built at the given store versions (read them before building it)"""
+        entry = CachedResponse(body, versions, valid_until)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Production server for the LiftLink API.
+
+Runs the same Flask routes as `python main.py` under uvicorn (ASGI) with a
+configurable number of worker processes. Each worker's event loop only handles
+connections; every request is handed to a pool of request threads, so blocking
+handler work (storage, and waiting on the password-hashing pool) never stalls
+the loop. Email is already sent by the mailer's own background threads. A slow
+request therefore only holds one request thread, not the whole worker.
+
+The one exception is GET /api/events: server-sent event streams stay open
+indefinitely, so they're answered on the event loop itself (see events.py)
+and thousands of idle streams cost coroutines, not request threads.
+
+    pip install -r requirements.txt
+    STORAGE_ENGINE=sqlite WEB_WORKERS=4 python serve.py
+
+Settings (defaults shown): HOST=127.0.0.1 PORT=5001 WEB_WORKERS=1 WEB_THREADS=32
+SHUTDOWN_TIMEOUT=5 (seconds to wait for open event streams when stopping)
+
+More than one worker needs state every process can see: use
+STORAGE_ENGINE=sqlite (and SESSION_MODE=signed to spread across machines).
+With in-memory storage the server falls back to a single worker.
+"""
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+from typing import List, Tuple
+from urllib.parse import parse_qs
+
+import uvicorn
+
+from main import (EVENT_KEEPALIVE_SECONDS, EVENT_STREAM_HEADERS, app, event_hub, event_stream_start, storage,
+                  user_for_event_stream)
+
+HOST = os.getenv('HOST', '127.0.0.1')
+PORT = int(os.getenv('PORT', '5001'))
+WEB_WORKERS = int(os.getenv('WEB_WORKERS', '1'))
+WEB_THREADS = int(os.getenv('WEB_THREADS', '32'))
+SHUTDOWN_TIMEOUT = float(os.getenv('SHUTDOWN_TIMEOUT', '5'))
+
+
+request_pool = ThreadPoolExecutor(max_workers=WEB_THREADS, thread_name_prefix='request')
+
+
+def build_environ(scope, body) -> dict:
+    """WSGI environ for an ASGI HTTP scope and its buffered request body"""
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin1'),
+        'PATH_INFO': scope['path'].encode().decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('latin1'),
+        'SERVER_NAME': scope['server'][0] if scope.get('server') else 'localhost',
+        'SERVER_PORT': str(scope['server'][1]) if scope.get('server') else '80',
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope['headers']:
+        name = name.decode('latin1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        value = value.decode('latin1')
+        if name in environ:
+            value = environ[name] + ('; ' if name == 'HTTP_COOKIE' else ',') + value
+        environ[name] = value
+    return environ
+
+
+def run_wsgi(environ) -> Tuple[int, List[Tuple[bytes, bytes]], bytes]:
+    """Run the Flask app on a request thread, returning (status, headers, body)"""
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers]
+
+    chunks = app(environ, start_response)
+    try:
+        body = b''.join(chunks)  # API responses are small JSON; event streams don't come through here
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+    return response['status'], response['headers'], body
+
+
+async def wsgi_app(scope, receive, send):
+    """
+    ASGI adapter for the Flask app. Requests run side by side on request_pool, so
+    a slow handler holds one request thread and never the event loop.
+    """
+    with SpooledTemporaryFile(max_size=65536) as body:
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body.write(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        body.seek(0)
+        status, headers, content = await asyncio.get_running_loop().run_in_executor(
+            request_pool, run_wsgi, build_environ(scope, body))
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': content})
+
+
+async def wait_for_disconnect(receive) -> None:
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def event_stream(scope, receive, send):
+    """GET /api/events on the event loop; same behaviour as main.event_stream"""
+    token = dict(scope['headers']).get(b'authorization', b'').decode()
+    ticket = parse_qs(scope['query_string'].decode()).get('ticket', [''])[0]
+    loop = asyncio.get_running_loop()
+    # Token checks and the opening event may touch the database, so they run on the request pool
+    user_id = await loop.run_in_executor(request_pool, user_for_event_stream, token, ticket)
+    if not user_id:
+        await send({'type': 'http.response.start', 'status': 401,
+                    'headers': [(b'content-type', b'application/json'), (b'access-control-allow-origin', b'*')]})
+        await send({'type': 'http.response.body', 'body': json.dumps({'error': 'Unauthorized'}).encode()})
+        return
+
+    subscription = event_hub.open_async(user_id)
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        start = await loop.run_in_executor(request_pool, event_stream_start, user_id)
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'access-control-allow-origin', b'*'),
+            *((name.lower().encode(), value.encode()) for name, value in EVENT_STREAM_HEADERS.items()),
+        ]})
+        await send({'type': 'http.response.body', 'body': start, 'more_body': True})
+        while True:
+            next_message = asyncio.ensure_future(subscription.next(EVENT_KEEPALIVE_SECONDS))
+            await asyncio.wait({next_message, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                next_message.cancel()
+                return
+            message = next_message.result()
+            if message is None:
+                break  # Fell too far behind; the client reconnects and resyncs
+            await send({'type': 'http.response.body', 'body': message, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        event_hub.close(subscription)
+        disconnected.cancel()
+
+
+async def lifespan(receive, send):
+    """Answer the server's startup and shutdown messages (the app has nothing to set up)"""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def asgi_app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    elif scope['type'] == 'websocket':
+        # The API has no websocket endpoints; closing before accepting rejects the handshake with 403
+        await receive()
+        await send({'type': 'websocket.close'})
+    elif scope['type'] != 'http':
+        raise ValueError(f"Unsupported ASGI scope type '{scope['type']}'")
+    elif scope['method'] == 'GET' and scope['path'] == '/api/events':
+        await event_stream(scope, receive, send)
+    else:
+        await wsgi_app(scope, receive, send)
+
+
+if __name__ == '__main__':
+    workers = WEB_WORKERS
+    if workers > 1 and storage.engine == 'memory':
+        print("⚠️  WARNING: In-memory storage can't be shared between workers. Running 1 worker; "
+              "set STORAGE_ENGINE=sqlite to use more.")
+        workers = 1
+    print(f"Starting LiftLink API on http://{HOST}:{PORT}/api/ ({workers} worker(s), {WEB_THREADS} request threads each)")
+    # Event streams never finish on their own, so don't wait on them indefinitely at shutdown
+    uvicorn.run('serve:asgi_app', host=HOST, port=PORT, workers=workers,
+                timeout_graceful_shutdown=SHUTDOWN_TIMEOUT)
@@ -0,0 +1,865 @@
+"""
+SQLite-backed stores for LiftLink data.
+
+Same interfaces as the in-memory stores in stores.py, but state lives in a
+single SQLite database file (WAL mode) so it survives restarts and can be
+shared by several worker processes. Records are stored as JSON alongside the
+columns the API filters on, and every query is a fixed parameterized statement
+so sqlite3's per-connection statement cache can reuse the prepared form.
+"""
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from fast_json import dumps as json_dumps
+from stores import (MAX_TOMBSTONES, Change, build_profile, normalize_email, normalize_filter_value,
+                    parse_profile_age, parse_session_time, request_sort_key)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    email TEXT NOT NULL UNIQUE,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS posts (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    user_id TEXT NOT NULL,
+    workout_type TEXT NOT NULL,
+    experience_level TEXT NOT NULL,
+    party_size TEXT NOT NULL,
+    gender_preference TEXT NOT NULL,
+    location TEXT NOT NULL,
+    starts_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS posts_user_id ON posts (user_id);
+CREATE INDEX IF NOT EXISTS posts_starts_at ON posts (starts_at);
+CREATE INDEX IF NOT EXISTS posts_workout_type ON posts (workout_type);
+CREATE INDEX IF NOT EXISTS posts_experience_level ON posts (experience_level);
+CREATE INDEX IF NOT EXISTS posts_party_size ON posts (party_size);
+CREATE INDEX IF NOT EXISTS posts_gender_preference ON posts (gender_preference);
+
+-- Trigram index of each post's lowercased location (rowid = posts.seq) for substring search
+CREATE VIRTUAL TABLE IF NOT EXISTS posts_location USING fts5(location, tokenize = 'trigram');
+CREATE TRIGGER IF NOT EXISTS posts_location_insert AFTER INSERT ON posts BEGIN
+    INSERT INTO posts_location (rowid, location) VALUES (NEW.seq, NEW.location); END;
+CREATE TRIGGER IF NOT EXISTS posts_location_update AFTER UPDATE OF location ON posts BEGIN
+    UPDATE posts_location SET location = NEW.location WHERE rowid = NEW.seq; END;
+CREATE TRIGGER IF NOT EXISTS posts_location_delete AFTER DELETE ON posts BEGIN
+    DELETE FROM posts_location WHERE rowid = OLD.seq; END;
+
+CREATE TABLE IF NOT EXISTS interest_requests (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    sender_id TEXT NOT NULL,
+    receiver_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    post_id TEXT,
+    data TEXT NOT NULL
+);
+-- Each user's received and sent requests in inbox order (stores.request_sort_key)
+CREATE INDEX IF NOT EXISTS interest_requests_receiver_order
+    ON interest_requests (receiver_id, COALESCE(json_extract(data, '$.created_at'), ''), id);
+CREATE INDEX IF NOT EXISTS interest_requests_sender_order
+    ON interest_requests (sender_id, COALESCE(json_extract(data, '$.created_at'), ''), id);
+CREATE INDEX IF NOT EXISTS interest_requests_key ON interest_requests (sender_id, receiver_id, type, post_id);
+
+CREATE TABLE IF NOT EXISTS profiles (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    gender TEXT,
+    experience_level TEXT,
+    focus TEXT,
+    age INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS profiles_gender ON profiles (gender);
+CREATE INDEX IF NOT EXISTS profiles_experience_level ON profiles (experience_level);
+CREATE INDEX IF NOT EXISTS profiles_focus ON profiles (focus);
+CREATE INDEX IF NOT EXISTS profiles_age ON profiles (age);
+
+-- Write counters per table, bumped by the triggers below; response caches compare them
+CREATE TABLE IF NOT EXISTS store_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL);
+
+-- Latest change to each record of a versioned table, tagged with the version it
+-- produced (see stores.ChangeLog). Requests are only visible to their participants.
+CREATE TABLE IF NOT EXISTS changes (
+    collection TEXT NOT NULL,
+    record_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    created INTEGER,
+    deleted INTEGER NOT NULL,
+    viewer1 TEXT,
+    viewer2 TEXT,
+    PRIMARY KEY (collection, record_id)
+);
+CREATE INDEX IF NOT EXISTS changes_version ON changes (collection, version);
+CREATE INDEX IF NOT EXISTS changes_tombstones ON changes (collection, version) WHERE deleted = 1;
+
+CREATE TABLE IF NOT EXISTS gym_info (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+
+CREATE TABLE IF NOT EXISTS sessions (
+    token TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    expires_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_user_id ON sessions (user_id);
+CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at);
+
+-- Short-lived single-use tickets for opening an event stream (same layout as sessions)
+CREATE TABLE IF NOT EXISTS stream_tickets (
+    token TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    expires_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS stream_tickets_user_id ON stream_tickets (user_id);
+CREATE INDEX IF NOT EXISTS stream_tickets_expires_at ON stream_tickets (expires_at);
+
+CREATE TABLE IF NOT EXISTS email_verification_tokens (
+    token TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL UNIQUE,
+    expires_at TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS email_verification_tokens_expires_at ON email_verification_tokens (expires_at);
+CREATE TABLE IF NOT EXISTS revoked_sessions (
+    key TEXT PRIMARY KEY,
+    revoked_at TEXT NOT NULL,
+    expires_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS revoked_sessions_expires_at ON revoked_sessions (expires_at);
+"""
+
+# Tables whose writes bump store_versions and are recorded in changes
+VERSIONED_TABLES = ('posts', 'interest_requests', 'profiles')
+
+
+def _change_trigger(table: str, op: str) -> str:
+    # Update-then-insert rather than INSERT OR REPLACE: a trigger's conflict clause is
+    # overridden by the outer statement's (e.g. the profiles upsert)
+    row = 'OLD' if op == 'DELETE' else 'NEW'
+    match = f"collection = '{table}' AND record_id = {row}.id"
+    version = f"(SELECT version FROM store_versions WHERE name = '{table}')"
+    deleted = int(op == 'DELETE')
+    created = version if op == 'INSERT' else 'NULL'
+    keep_created = 'created' if op == 'UPDATE' else created
+    viewers = (f'{row}.sender_id', f'{row}.receiver_id') if table == 'interest_requests' else ('NULL', 'NULL')
+    return (f"CREATE TRIGGER IF NOT EXISTS {table}_change_{op.lower()} AFTER {op} ON {table} BEGIN "
+            f"UPDATE store_versions SET version = version + 1 WHERE name = '{table}'; "
+            f"UPDATE changes SET version = {version}, created = {keep_created}, deleted = {deleted}, "
+            f"viewer1 = {viewers[0]}, viewer2 = {viewers[1]} WHERE {match}; "
+            f"INSERT INTO changes (collection, record_id, version, created, deleted, viewer1, viewer2) "
+            f"SELECT '{table}', {row}.id, {version}, {created}, {deleted}, {viewers[0]}, {viewers[1]} "
+            f"WHERE NOT EXISTS (SELECT 1 FROM changes WHERE {match}); END;\n")
+
+
+# Each table's version and change-log floor ('<table>:floor') start at 0
+SCHEMA += ''.join(
+    f"INSERT OR IGNORE INTO store_versions (name, version) VALUES ('{table}', 0), ('{table}:floor', 0);\n" +
+    ''.join(_change_trigger(table, op) for op in ('INSERT', 'UPDATE', 'DELETE'))
+    for table in VERSIONED_TABLES)
+
+# Session start and expiry times are stored in a fixed-width format so string comparison is time order
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+def format_time(value: Optional[datetime]) -> Optional[str]:
+    return value.strftime(TIME_FORMAT) if value is not None else None
+
+
+class SQLiteDatabase:
+    """A database file with one connection per thread"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self.conn
+        new_location_index = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'posts_location'").fetchone() is None
+        conn.executescript(SCHEMA)
+        if new_location_index:
+            # Index the locations of posts stored before the trigram table existed
+            conn.execute('INSERT INTO posts_location (rowid, location) SELECT seq, location FROM posts')
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit mode; writes that need atomicity go through transaction()
+            conn = sqlite3.connect(self.path, isolation_level=None, cached_statements=256, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Run a read-modify-write sequence under a write lock (joins an open transaction)"""
+        conn = self.conn
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    @contextmanager
+    def snapshot(self):
+        """Run several reads against one consistent view of the database"""
+        conn = self.conn
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute('BEGIN')
+        try:
+            yield conn
+        finally:
+            conn.execute('COMMIT')
+
+    def version(self, table: str) -> int:
+        """Write counter for one of VERSIONED_TABLES"""
+        return self.conn.execute('SELECT version FROM store_versions WHERE name = ?', (table,)).fetchone()[0]
+
+    def changes(self, table: str, since: int, viewer: Optional[str] = None) -> Tuple[Optional[List[Change]], int]:
+        """Same contract as stores.changes_since, for one of VERSIONED_TABLES"""
+        with self.snapshot() as conn:
+            version, floor = (conn.execute('SELECT version FROM store_versions WHERE name = ?', (name,)).fetchone()[0]
+                              for name in (table, f'{table}:floor'))
+            if since < floor or since > version:
+                return None, version
+            if viewer is None:
+                rows = conn.execute(
+                    'SELECT record_id, created, deleted FROM changes WHERE collection = ? AND version > ? '
+                    'ORDER BY version', (table, since))
+            else:
+                rows = conn.execute(
+                    'SELECT record_id, created, deleted FROM changes WHERE collection = ? AND version > ? '
+                    'AND (viewer1 = ? OR viewer2 = ?) ORDER BY version', (table, since, viewer, viewer))
+            changes = [(record_id, 'delete' if deleted else 'insert' if (created or 0) > since else 'update')
+                       for record_id, created, deleted in rows]
+        return changes, version
+
+    def prune_changes(self, table: str, max_tombstones: int = MAX_TOMBSTONES) -> None:
+        """Drop the oldest half of a table's tombstones once there are too many, raising its floor past them"""
+        count_sql = 'SELECT COUNT(*) FROM changes WHERE collection = ? AND deleted = 1'
+        if self.conn.execute(count_sql, (table,)).fetchone()[0] <= max_tombstones:
+            return
+        with self.transaction() as conn:
+            # Recount under the write lock; another worker may have pruned already
+            count = conn.execute(count_sql, (table,)).fetchone()[0]
+            if count <= max_tombstones:
+                return
+            cutoff = conn.execute(
+                'SELECT version FROM changes WHERE collection = ? AND deleted = 1 ORDER BY version LIMIT 1 OFFSET ?',
+                (table, count - max_tombstones // 2 - 1)).fetchone()[0]
+            conn.execute('DELETE FROM changes WHERE collection = ? AND deleted = 1 AND version <= ?', (table, cutoff))
+            conn.execute('UPDATE store_versions SET version = MAX(version, ?) WHERE name = ?',
+                         (cutoff, f'{table}:floor'))
+
+    def fetch_records(self, sql: str, params: Tuple = ()) -> List[Dict]:
+        """Decode the JSON data column of every row a query returns"""
+        return [json.loads(row[0]) for row in self.conn.execute(sql, params)]
+
+    def fetch_record(self, sql: str, params: Tuple = ()) -> Optional[Dict]:
+        row = self.conn.execute(sql, params).fetchone()
+        return json.loads(row[0]) if row else None
+
+
+class SQLiteGymInfoStore:
+    """GymInfoStore backed by the gym_info table (user_id -> JSON record)"""
+
+    def __init__(self, db: SQLiteDatabase):
+        self._db = db
+
+    def __len__(self) -> int:
+        return self._db.conn.execute('SELECT COUNT(*) FROM gym_info').fetchone()[0]
+
+    def __contains__(self, user_id: str) -> bool:
+        return self._db.conn.execute('SELECT 1 FROM gym_info WHERE key = ?', (user_id,)).fetchone() is not None
+
+    def get(self, user_id: str) -> Optional[Dict]:
+        return self._db.fetch_record('SELECT value FROM gym_info WHERE key = ?', (user_id,))
+
+    def update(self, user_id: str, changes: Dict) -> Dict:
+        with self._db.transaction() as conn:
+            gym_info = {**(self.get(user_id) or {}), **changes, 'user_id': user_id}
+            conn.execute('INSERT OR REPLACE INTO gym_info (key, value) VALUES (?, ?)', (user_id, json.dumps(gym_info)))
+        return gym_info
+
+    def remove(self, user_id: str) -> Optional[Dict]:
+        with self._db.transaction() as conn:
+            gym_info = self.get(user_id)
+            if gym_info is not None:
+                conn.execute('DELETE FROM gym_info WHERE key = ?', (user_id,))
+        return gym_info
+
+    def clear(self) -> None:
+        self._db.conn.execute('DELETE FROM gym_info')
+
+
+class SQLiteUserStore:
+    """UserStore backed by the users table (unique indexes on id and normalized email)"""
+
+    def __init__(self, db: SQLiteDatabase):
+        self._db = db
+        self.migrate_legacy_emails()
+
+    def __len__(self) -> int:
+        return self._db.conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+
+    def __contains__(self, email: str) -> bool:
+        return self._db.conn.execute('SELECT 1 FROM users WHERE email = ?',
+                                     (normalize_email(email),)).fetchone() is not None
+
+    def get_by_email(self, email: str) -> Optional[Dict]:
+        return self._db.fetch_record('SELECT data FROM users WHERE email = ?', (normalize_email(email),))
+
+    def get_by_id(self, user_id: str) -> Optional[Dict]:
+        return self._db.fetch_record('SELECT data FROM users WHERE id = ?', (user_id,))
+
+    def add(self, user: Dict) -> None:
+        self._db.conn.execute('INSERT OR REPLACE INTO users (id, email, data) VALUES (?, ?, ?)',
+                              (user['id'], normalize_email(user['email']), json.dumps(user)))
+
+    def add_unique(self, user: Dict) -> bool:
+        return self._db.conn.execute('INSERT OR IGNORE INTO users (id, email, data) VALUES (?, ?, ?)',
+                                     (user['id'], normalize_email(user['email']), json.dumps(user))).rowcount == 1
+
+    def update(self, user_id: str, changes: Dict) -> Optional[Dict]:
+        with self._db.transaction():
+            user = self.get_by_id(user_id)
+            if user is None:
+                return None
+            user.update({k: v for k, v in changes.items() if k not in ('id', 'email')})
+            self._db.conn.execute('UPDATE users SET data = ? WHERE id = ?', (json.dumps(user), user_id))
+        return user
+
+    def remove(self, user_id: str) -> Optional[Dict]:
+        with self._db.transaction():
+            user = self.get_by_id(user_id)
+            if user is not None:
+                self._db.conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
+        return user
+
+    def values(self) -> Iterator[Dict]:
+        return iter(self._db.fetch_records('SELECT data FROM users ORDER BY rowid'))
+
+    def migrate_legacy_emails(self) -> None:
+        """
+        Normalize users stored under a mixed-case email, in both the email column and the
+        record itself, as registration does now (one scan, only finds rows on the first run)
+        """
+        with self._db.transaction() as conn:
+            rows = conn.execute("SELECT id, email, data FROM users "
+                                "WHERE email != lower(trim(email)) OR json_extract(data, '$.email') != email").fetchall()
+            for user_id, email, data in rows:
+                key = normalize_email(email)
+                if key != email and conn.execute('SELECT 1 FROM users WHERE email = ?', (key,)).fetchone():
+                    print(f"WARNING: Users {email} and {key} differ only by letter case; {email} can't log in until one is renamed.")
+                    continue
+                user = json.loads(data)
+                user['email'] = key
+                conn.execute('UPDATE users SET email = ?, data = ? WHERE id = ?', (key, json.dumps(user), user_id))
+
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        return iter([(normalize_email(user['email']), user) for user in self.values()])
+
+    def clear(self) -> None:
+        self._db.conn.execute('DELETE FROM users')
+
+
+class SQLitePostStore:
+    """PostStore backed by the posts table, with indexed filter and start-time columns"""
+
+    FILTER_FIELDS = ('workout_type', 'experience_level', 'party_size', 'gender_preference')
+
+    def __init__(self, db: SQLiteDatabase):
+        self._db = db
+
+    @property
+    def version(self) -> int:
+        return self._db.version('posts')
+
+    def __len__(self) -> int:
+        return self._db.conn.execute('SELECT COUNT(*) FROM posts').fetchone()[0]
+
+    def __contains__(self, post_id: str) -> bool:
+        return self._db.conn.execute('SELECT 1 FROM posts WHERE id = ?', (post_id,)).fetchone() is not None
+
+    def get(self, post_id: str) -> Optional[Dict]:
+        return self._db.fetch_record('SELECT data FROM posts WHERE id = ?', (post_id,))
+
+    def _columns(self, post: Dict) -> Tuple:
+        """Indexed column values for a post, in schema order after id/user_id"""
+        return (*(normalize_filter_value(post.get(field)) for field in self.FILTER_FIELDS),
+                normalize_filter_value(post.get('location')),
+                format_time(parse_session_time(post.get('date_time'))),
+                json.dumps(post))
+
+    def add(self, post: Dict) -> Dict:
+        # Delete, then insert: the row INSERT OR REPLACE drops wouldn't fire the location index trigger
+        with self._db.transaction() as conn:
+            conn.execute('DELETE FROM posts WHERE id = ?', (post['id'],))
+            conn.execute(
+                'INSERT INTO posts (id, user_id, workout_type, experience_level, party_size, '
+                'gender_preference, location, starts_at, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (post['id'], post['user_id'], *self._columns(post)))
+        return post
+
+    def update(self, post_id: str, changes: Dict) -> Optional[Dict]:
+        with self._db.transaction():
+            post = self.get(post_id)
+            if post is None:
+                return None
+            post.update({k: v for k, v in changes.items() if k not in ('id', 'user_id')})
+            self._db.conn.execute(
+                'UPDATE posts SET workout_type = ?, experience_level = ?, party_size = ?, '
+                'gender_preference = ?, location = ?, starts_at = ?, data = ? WHERE id = ?',
+                (*self._columns(post), post_id))
+        return post
+
+    def remove(self, post_id: str) -> Optional[Dict]:
+        with self._db.transaction():
+            post = self.get(post_id)
+            if post is not None:
+                self._db.conn.execute('DELETE FROM posts WHERE id = ?', (post_id,))
+        self._db.prune_changes('posts')
+        return post
+
+    def remove_by_user(self, user_id: str) -> List[Dict]:
+        with self._db.transaction():
+            removed = self.by_user(user_id)
+            self._db.conn.execute('DELETE FROM posts WHERE user_id = ?', (user_id,))
+        self._db.prune_changes('posts')
+        return removed
+
+    def by_user(self, user_id: str) -> List[Dict]:
+        return self._db.fetch_records('SELECT data FROM posts WHERE user_id = ? ORDER BY seq', (user_id,))
+
+    def values(self) -> List[Dict]:
+        return self._db.fetch_records('SELECT data FROM posts ORDER BY seq')
+
+    def changes(self, since: int) -> Tuple[Optional[List[Change]], int]:
+        return self._db.changes('posts', since)
+
+    def encoded(self, posts: List[Dict]) -> List[bytes]:
+        # Records are decoded fresh from each query, so there's nothing to reuse between requests
+        return [json_dumps(post) for post in posts]
+
+    def upcoming(self, now: Optional[datetime] = None) -> List[Dict]:
+        return self._db.fetch_records(
+            'SELECT data FROM posts WHERE starts_at IS NULL OR starts_at > ? ORDER BY seq',
+            (format_time(now or datetime.now()),))
+
+    def next_expiry(self) -> Optional[datetime]:
+        row = self._db.conn.execute('SELECT MIN(starts_at) FROM posts WHERE starts_at > ?',
+                                    (format_time(datetime.now()),)).fetchone()
+        return datetime.strptime(row[0], TIME_FORMAT) if row[0] else None
+
+    def search(self, filters: Dict[str, str], location: Optional[str] = None,
+               after: Optional[int] = None, limit: Optional[int] = None,
+               now: Optional[datetime] = None) -> Tuple[List[Dict], Optional[int]]:
+        """
+        Same contract as PostStore.search. A location of 3+ characters is looked up in
+        the posts_location trigram index, which yields candidates in seq order so a page
+        stops early; instr() on the lowercased column confirms each one.
+        """
+        source = 'posts p'
+        order = 'p.seq'
+        clauses = ['(p.starts_at IS NULL OR p.starts_at > ?)']
+        params: List = [format_time(now or datetime.now())]
+        if location and len(location) >= 3:
+            source = 'posts_location f JOIN posts p ON p.seq = f.rowid'
+            order = 'f.rowid'
+            clauses.insert(0, 'f.posts_location MATCH ?')
+            params.insert(0, '"' + location.lower().replace('"', '""') + '"')
+        for field in self.FILTER_FIELDS:
+            value = filters.get(field)
+            if not value:
+                continue
+            if field == 'gender_preference':
+                clauses.append("(p.gender_preference = ? OR p.gender_preference = '')")
+            else:
+                clauses.append(f'p.{field} = ?')
+            params.append(normalize_filter_value(value))
+        if location:
+            clauses.append('instr(p.location, ?) > 0')
+            params.append(location.lower())
+        if after is not None:
+            clauses.append(f'{order} > ?')
+            params.append(after)
+        sql = f'SELECT p.seq, p.data FROM {source} WHERE {" AND ".join(clauses)} ORDER BY {order}'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit + 1)
+
+        rows = self._db.conn.execute(sql, params).fetchall()
+        next_after = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_after = rows[-1][0]
+        return [json.loads(data) for _, data in rows], next_after
+
+    def clear(self) -> None:
+        self._db.conn.execute('DELETE FROM posts')
+        self._db.prune_changes('posts')
+
+
+class SQLiteRequestStore:
+    """RequestStore backed by the interest_requests table"""
+
+    def __init__(self, db: SQLiteDatabase):
+        self._db = db
+
+    @property
+    def version(self) -> int:
+        return self._db.version('interest_requests')
+
+    def __len__(self) -> int:
+        return self._db.conn.execute('SELECT COUNT(*) FROM interest_requests').fetchone()[0]
+
+    def get(self, request_id: str) -> Optional[Dict]:
+        return self._db.fetch_record('SELECT data FROM interest_requests WHERE id = ?', (request_id,))
+
+    def find(self, sender_id: str, receiver_id: str, request_type: str,
+             post_id: Optional[str] = None) -> Optional[Dict]:
+        return self._db.fetch_record(
+            'SELECT data FROM interest_requests '
+            'WHERE sender_id = ? AND receiver_id = ? AND type = ? AND post_id IS ? LIMIT 1',
+            (sender_id, receiver_id, request_type, post_id))
+
+    def add(self, interest_request: Dict) -> None:
+        self._db.conn.execute(
+            'INSERT OR REPLACE INTO interest_requests (id, sender_id, receiver_id, type, post_id, data) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (interest_request['id'], interest_request['sender_id'], interest_request['receiver_id'],
+             interest_request['type'], interest_request.get('post_id'), json.dumps(interest_request)))
+
+    def add_unique(self, interest_request: Dict) -> bool:
+        with self._db.transaction():
+            if self.find(interest_request['sender_id'], interest_request['receiver_id'],
+                         interest_request['type'], interest_request.get('post_id')) is not None:
+                return False
+            self.add(interest_request)
+        return True
+
+    def update(self, request_id: str, changes: Dict) -> Optional[Dict]:
+        with self._db.transaction():
+            interest_request = self.get(request_id)
+            if interest_request is None:
+                return None
+            interest_request.update({k: v for k, v in changes.items() if k not in ('id', 'sender_id', 'receiver_id')})
+            self._db.conn.execute('UPDATE interest_requests SET data = ? WHERE id = ?',
+                                  (json.dumps(interest_request), request_id))
+        return interest_request
+
+    def remove(self, request_id: str) -> Optional[Dict]:
+        with self._db.transaction():
+            interest_request = self.get(request_id)
+            if interest_request is not None:
+                self._db.conn.execute('DELETE FROM interest_requests WHERE id = ?', (request_id,))
+        self._db.prune_changes('interest_requests')
+        return interest_request
+
+    def remove_for_user(self, user_id: str) -> List[Dict]:
+        with self._db.transaction():
+            removed = self._db.fetch_records(
+                'SELECT data FROM interest_requests WHERE receiver_id = ? '
+                'UNION ALL SELECT data FROM interest_requests WHERE sender_id = ? AND receiver_id != ?',
+                (user_id, user_id, user_id))
+            self._db.conn.execute('DELETE FROM interest_requests WHERE receiver_id = ?', (user_id,))
+            self._db.conn.execute('DELETE FROM interest_requests WHERE sender_id = ?', (user_id,))
+        self._db.prune_changes('interest_requests')
+        return removed
+
+    def received(self, user_id: str) -> List[Dict]:
+        return self._db.fetch_records(
+            'SELECT data FROM interest_requests WHERE receiver_id = ? ORDER BY seq', (user_id,))
+
+    def sent(self, user_id: str) -> List[Dict]:
+        return self._db.fetch_records(
+            'SELECT data FROM interest_requests WHERE sender_id = ? ORDER BY seq', (user_id,))
+
+    def page(self, box: str, user_id: str, after: Optional[Tuple[str, str]], limit: int,
+             where: Optional[Callable[[Dict], bool]] = None) -> Tuple[List[Dict], Optional[Tuple[str, str]]]:
+        # Rows come off the *_order index one at a time, so the walk stops once the page is full
+        column = {'received': 'receiver_id', 'sent': 'sender_id'}[box]
+        sort_key = "COALESCE(json_extract(data, '$.created_at'), '')"
+        sql = f'SELECT data FROM interest_requests WHERE {column} = ?'
+        params: Tuple = (user_id,)
+        if after is not None:
+            # The plain >= lets SQLite seek the index to the cursor; the row value breaks ties by id
+            sql += f' AND {sort_key} >= ? AND ({sort_key}, id) > (?, ?)'
+            params += (after[0], *after)
+        page = []
+        for (data,) in self._db.conn.execute(f'{sql} ORDER BY {sort_key}, id', params):
+            interest_request = json.loads(data)
+            if where is None or where(interest_request):
+                if len(page) == limit:
+                    return page, request_sort_key(page[-1])
+                page.append(interest_request)
+        return page, None
+
+    def values(self) -> List[Dict]:
+        return self._db.fetch_records('SELECT data FROM interest_requests ORDER BY seq')
+
+    def changes(self, since: int, user_id: str) -> Tuple[Optional[List[Change]], int]:
+        return self._db.changes('interest_requests', since, user_id)
+
+    def clear(self) -> None:
+        self._db.conn.execute('DELETE FROM interest_requests')
+        self._db.prune_changes('interest_requests')
+
+
+class SQLiteProfileStore:
+    """ProfileStore backed by the profiles table, with facet and age indexes"""
+
+    FACET_FIELDS = ('gender', 'experience_level', 'focus')
+
+    def __init__(self, db: SQLiteDatabase, users: SQLiteUserStore, gym_info: SQLiteGymInfoStore):
+        self._db = db
+        self._users = users
+        self._gym_info = gym_info
+
+    @property
+    def version(self) -> int:
+        return self._db.version('profiles')
+
+    def __len__(self) -> int:
+        return self._db.conn.execute('SELECT COUNT(*) FROM profiles').fetchone()[0]
+
+    def get(self, user_id: str) -> Optional[Dict]:
+        return self._db.fetch_record('SELECT data FROM profiles WHERE id = ?', (user_id,))
+
+    def refresh(self, user_id: str) -> Optional[Dict]:
+        with self._db.transaction():
+            user = self._users.get_by_id(user_id)
+            if user is None:
+                self._db.conn.execute('DELETE FROM profiles WHERE id = ?', (user_id,))
+                return None
+            profile = build_profile(user, self._gym_info.get(user_id) or {})
+            # Upsert so an existing profile keeps its paging position
+            self._db.conn.execute(
+                'INSERT INTO profiles (id, gender, experience_level, focus, age, data) VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (id) DO UPDATE SET gender = excluded.gender, experience_level = excluded.experience_level, '
+                'focus = excluded.focus, age = excluded.age, data = excluded.data',
+                (user_id, profile['gender'] or None, profile['experience_level'] or None, profile['focus'] or None,
+                 parse_profile_age(profile['age']), json.dumps(profile)))
+        return profile
+
+    def remove(self, user_id: str) -> Optional[Dict]:
+        with self._db.transaction():
+            profile = self.get(user_id)
+            if profile is not None:
+                self._db.conn.execute('DELETE FROM profiles WHERE id = ?', (user_id,))
+        self._db.prune_changes('profiles')
+        return profile
+
+    def search(self, filters: Dict[str, str], same_gender_as: Optional[str] = None,
+               age_min: Optional[int] = None, age_max: Optional[int] = None,
+               exclude_id: Optional[str] = None, after: Optional[int] = None,
+               limit: Optional[int] = None) -> Tuple[List[Dict], Optional[int]]:
+        """Same contract as ProfileStore.search"""
+        clauses: List[str] = []
+        params: List = []
+        for field in self.FACET_FIELDS:
+            value = filters.get(field)
+            if value:
+                clauses.append(f'({field} = ? OR {field} IS NULL)')
+                params.append(value)
+        if same_gender_as:
+            clauses.append('gender = ?')
+            params.append(same_gender_as)
+        if age_min is not None:
+            clauses.append('(age IS NULL OR age >= ?)')
+            params.append(age_min)
+        if age_max is not None:
+            clauses.append('(age IS NULL OR age <= ?)')
+            params.append(age_max)
+        if exclude_id is not None:
+            clauses.append('id != ?')
+            params.append(exclude_id)
+        if after is not None:
+            clauses.append('seq > ?')
+            params.append(after)
+        sql = 'SELECT seq, data FROM profiles'
+        if clauses:
+            sql += f' WHERE {" AND ".join(clauses)}'
+        sql += ' ORDER BY seq'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit + 1)
+
+        rows = self._db.conn.execute(sql, params).fetchall()
+        next_after = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_after = rows[-1][0]
+        return [json.loads(data) for _, data in rows], next_after
+
+    def changes(self, since: int) -> Tuple[Optional[List[Change]], int]:
+        return self._db.changes('profiles', since)
+
+    def encoded(self, profiles: List[Dict]) -> List[bytes]:
+        return [json_dumps(profile) for profile in profiles]
+
+    def clear(self) -> None:
+        self._db.conn.execute('DELETE FROM profiles')
+        self._db.prune_changes('profiles')
+
+
+class SQLiteSessionStore:
+    """
+    SessionStore backed by the sessions table (indexed by user and expiry; rowid is creation order).
+    Event stream tickets use the same layout in the stream_tickets table.
+    """
+
+    def __init__(self, db: SQLiteDatabase, ttl: timedelta = timedelta(days=7), max_per_user: int = 10,
+                 table: str = 'sessions'):
+        self._db = db
+        self._table = table
+        self.ttl = ttl
+        self.max_per_user = max_per_user
+
+    def __len__(self) -> int:
+        return self._db.conn.execute(f'SELECT COUNT(*) FROM {self._table}').fetchone()[0]
+
+    def __contains__(self, token: str) -> bool:
+        return self.get(token) is not None
+
+    def get(self, token: str, now: Optional[datetime] = None) -> Optional[str]:
+        row = self._db.conn.execute(f'SELECT user_id, expires_at FROM {self._table} WHERE token = ?', (token,)).fetchone()
+        if row is None:
+            return None
+        if row[1] <= format_time(now or datetime.now()):
+            self._db.conn.execute(f'DELETE FROM {self._table} WHERE token = ?', (token,))
+            return None
+        return row[0]
+
+    def add(self, token: str, user_id: str, now: Optional[datetime] = None) -> None:
+        now = now or datetime.now()
+        with self._db.transaction() as conn:
+            self.expire(now)
+            conn.execute(f'INSERT OR REPLACE INTO {self._table} (token, user_id, expires_at) VALUES (?, ?, ?)',
+                         (token, user_id, format_time(now + self.ttl)))
+            conn.execute(
+                f'DELETE FROM {self._table} WHERE user_id = ? AND rowid NOT IN '
+                f'(SELECT rowid FROM {self._table} WHERE user_id = ? ORDER BY rowid DESC LIMIT ?)',
+                (user_id, user_id, self.max_per_user))
+
+    def take(self, token: str, now: Optional[datetime] = None) -> Optional[str]:
+        with self._db.transaction() as conn:
+            row = conn.execute(f'SELECT user_id, expires_at FROM {self._table} WHERE token = ?', (token,)).fetchone()
+            if row is not None:
+                conn.execute(f'DELETE FROM {self._table} WHERE token = ?', (token,))
+        return row[0] if row and row[1] > format_time(now or datetime.now()) else None
+
+    def remove(self, token: str) -> Optional[str]:
+        with self._db.transaction() as conn:
+            row = conn.execute(f'SELECT user_id FROM {self._table} WHERE token = ?', (token,)).fetchone()
+            if row is not None:
+                conn.execute(f'DELETE FROM {self._table} WHERE token = ?', (token,))
+        return row[0] if row else None
+
+    def remove_for_user(self, user_id: str) -> List[str]:
+        with self._db.transaction() as conn:
+            tokens = [row[0] for row in conn.execute(f'SELECT token FROM {self._table} WHERE user_id = ?', (user_id,))]
+            conn.execute(f'DELETE FROM {self._table} WHERE user_id = ?', (user_id,))
+        return tokens
+
+    def expire(self, now: Optional[datetime] = None) -> None:
+        self._db.conn.execute(f'DELETE FROM {self._table} WHERE expires_at <= ?', (format_time(now or datetime.now()),))
+
+    def clear(self) -> None:
+        self._db.conn.execute(f'DELETE FROM {self._table}')
+
+
+class SQLiteVerificationTokenStore:
+    """VerificationTokenStore backed by the email_verification_tokens table (one row per user)"""
+
+    def __init__(self, db: SQLiteDatabase, ttl: timedelta = timedelta(hours=48)):
+        self._db = db
+        self.ttl = ttl
+
+    def __len__(self) -> int:
+        return self._db.conn.execute('SELECT COUNT(*) FROM email_verification_tokens').fetchone()[0]
+
+    def __contains__(self, token: str) -> bool:
+        return self.get(token) is not None
+
+    def get(self, token: str, now: Optional[datetime] = None) -> Optional[Dict]:
+        row = self._db.conn.execute(
+            'SELECT data, expires_at FROM email_verification_tokens WHERE token = ?', (token,)).fetchone()
+        if row is None:
+            return None
+        if row[1] <= format_time(now or datetime.now()):
+            self._db.conn.execute('DELETE FROM email_verification_tokens WHERE token = ?', (token,))
+            return None
+        return json.loads(row[0])
+
+    def issue(self, token: str, user_id: str, email: str, now: Optional[datetime] = None) -> Dict:
+        now = now or datetime.now()
+        record = {'user_id': user_id, 'email': email, 'created_at': now.isoformat()}
+        with self._db.transaction() as conn:
+            self.expire(now)
+            # Replaces the user's previous token through the UNIQUE user_id constraint
+            conn.execute('INSERT OR REPLACE INTO email_verification_tokens (token, user_id, expires_at, data) '
+                         'VALUES (?, ?, ?, ?)', (token, user_id, format_time(now + self.ttl), json.dumps(record)))
+        return record
+
+    def remove(self, token: str) -> Optional[Dict]:
+        with self._db.transaction() as conn:
+            record = self._db.fetch_record('SELECT data FROM email_verification_tokens WHERE token = ?', (token,))
+            if record is not None:
+                conn.execute('DELETE FROM email_verification_tokens WHERE token = ?', (token,))
+        return record
+
+    def remove_for_user(self, user_id: str) -> Optional[Dict]:
+        with self._db.transaction() as conn:
+            record = self._db.fetch_record('SELECT data FROM email_verification_tokens WHERE user_id = ?', (user_id,))
+            if record is not None:
+                conn.execute('DELETE FROM email_verification_tokens WHERE user_id = ?', (user_id,))
+        return record
+
+    def expire(self, now: Optional[datetime] = None) -> None:
+        self._db.conn.execute('DELETE FROM email_verification_tokens WHERE expires_at <= ?',
+                              (format_time(now or datetime.now()),))
+
+    def clear(self) -> None:
+        self._db.conn.execute('DELETE FROM email_verification_tokens')
+
+
+class SQLiteRevocationList:
+    """RevocationList backed by the revoked_sessions table, shared by every process using the database"""
+
+    def __init__(self, db: SQLiteDatabase):
+        self._db = db
+
+    def __len__(self) -> int:
+        return self._db.conn.execute('SELECT COUNT(*) FROM revoked_sessions').fetchone()[0]
+
+    def revoke(self, key: str, expires_at: datetime, now: Optional[datetime] = None) -> None:
+        now = now or datetime.now()
+        with self._db.transaction() as conn:
+            self.expire(now)
+            conn.execute('INSERT OR REPLACE INTO revoked_sessions (key, revoked_at, expires_at) VALUES (?, ?, ?)',
+                         (key, format_time(now), format_time(expires_at)))
+
+    def revoked_at(self, key: str) -> Optional[datetime]:
+        row = self._db.conn.execute('SELECT revoked_at FROM revoked_sessions WHERE key = ?', (key,)).fetchone()
+        return datetime.strptime(row[0], TIME_FORMAT) if row else None
+
+    def expire(self, now: Optional[datetime] = None) -> None:
+        self._db.conn.execute('DELETE FROM revoked_sessions WHERE expires_at <= ?', (format_time(now or datetime.now()),))
+
+    def clear(self) -> None:
+        self._db.conn.execute('DELETE FROM revoked_sessions')
@@ -0,0 +1,80 @@
+"""
+Storage engine selection.
+
+The API handlers only talk to the store interfaces (UserStore, PostStore,
+RequestStore, GymInfoStore, ProfileStore, SessionStore, VerificationTokenStore and
+RevocationList; event stream tickets are a second SessionStore). open_storage()
+wires up one implementation of each:
+
+- 'memory': everything in process memory (default; lost on restart)
+- 'sqlite': a shared SQLite database file, safe for multiple worker processes
+"""
+from datetime import timedelta
+
+from stores import (GymInfoStore, PostStore, ProfileStore, RequestStore, RevocationList, SessionStore,
+                    UserStore, VerificationTokenStore)
+
+ENGINES = ('memory', 'sqlite')
+
+
+class Storage:
+    """The set of stores one engine provides"""
+
+    def __init__(self, engine: str, users, posts, interest_requests,
+                 gym_info, user_sessions, verification_tokens, profiles,
+                 revoked_sessions, stream_tickets):
+        self.engine = engine
+        self.users = users
+        self.posts = posts
+        self.interest_requests = interest_requests
+        self.gym_info = gym_info
+        self.user_sessions = user_sessions
+        self.verification_tokens = verification_tokens
+        self.profiles = profiles
+        self.revoked_sessions = revoked_sessions
+        self.stream_tickets = stream_tickets
+
+
+def open_storage(engine: str = 'memory', sqlite_path: str = 'liftlink.db',
+                 session_ttl: timedelta = timedelta(days=7), max_sessions_per_user: int = 10,
+                 verification_ttl: timedelta = timedelta(hours=48),
+                 stream_ticket_ttl: timedelta = timedelta(seconds=30)) -> Storage:
+    """Create the stores for the named engine"""
+    if engine == 'memory':
+        users = UserStore()
+        gym_info = GymInfoStore()
+        return Storage(
+            engine,
+            users=users,
+            posts=PostStore(),
+            interest_requests=RequestStore(),
+            gym_info=gym_info,
+            user_sessions=SessionStore(session_ttl, max_sessions_per_user),
+            verification_tokens=VerificationTokenStore(verification_ttl),
+            profiles=ProfileStore(users, gym_info),
+            revoked_sessions=RevocationList(),
+            stream_tickets=SessionStore(stream_ticket_ttl, max_sessions_per_user),
+        )
+
+    if engine == 'sqlite':
+        # Imported lazily so the in-memory engine doesn't depend on it
+        from sqlite_stores import (SQLiteDatabase, SQLiteGymInfoStore, SQLitePostStore, SQLiteProfileStore,
+                                   SQLiteRequestStore, SQLiteRevocationList, SQLiteSessionStore,
+                                   SQLiteUserStore, SQLiteVerificationTokenStore)
+        db = SQLiteDatabase(sqlite_path)
+        users = SQLiteUserStore(db)
+        gym_info = SQLiteGymInfoStore(db)
+        return Storage(
+            engine,
+            users=users,
+            posts=SQLitePostStore(db),
+            interest_requests=SQLiteRequestStore(db),
+            gym_info=gym_info,
+            user_sessions=SQLiteSessionStore(db, session_ttl, max_sessions_per_user),
+            verification_tokens=SQLiteVerificationTokenStore(db, verification_ttl),
+            profiles=SQLiteProfileStore(db, users, gym_info),
+            revoked_sessions=SQLiteRevocationList(db),
+            stream_tickets=SQLiteSessionStore(db, stream_ticket_ttl, max_sessions_per_user, table='stream_tickets'),
+        )
+
+    raise ValueError(f"Unknown storage engine '{engine}' (expected one of: {', '.join(ENGINES)})")
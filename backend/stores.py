@@ -0,0 +1,1288 @@
+"""
+In-memory stores for LiftLink data.
+
+Each store keeps its primary map plus the secondary indexes the API handlers
+need, so lookups don't have to scan every record.
+
+Stores are safe to share between request threads: each one has a
+readers-writer lock, so any number of reads run together while a write gets
+the store to itself. Records are copy-on-write; an update stores a new dict
+instead of changing the old one, so a record a handler is still serializing
+never changes under it. Every write also bumps the store's version counter,
+which response caches use to tell whether what they hold is still current.
+
+Users, posts, requests and gym info are held as compact slotted records (records.py);
+stores accept plain dicts and convert them on the way in.
+"""
+import bisect
+import functools
+import heapq
+import itertools
+import secrets
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from fast_json import FragmentCache
+from records import GymInfo, InterestRequest, Post, User
+
+
+def parse_session_time(value) -> Optional[datetime]:
+    """Parse a post's date_time into a naive local datetime (None if it can't be parsed)"""
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def normalize_filter_value(value) -> str:
+    """Normalized key for case-insensitive exact-match filters ('' for missing values)"""
+    if value is None:
+        return ''
+    return str(value).lower()
+
+
+def normalize_email(email: str) -> str:
+    """Lookup key for an email address (emails are matched case-insensitively)"""
+    return email.strip().lower()
+
+
+def trigrams(text: str) -> Set[str]:
+    """Distinct 3-character substrings of text"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def build_profile(user: Dict, user_gym_info: Dict) -> Dict:
+    """Public profile for a user, merged with their gym info"""
+    return {
+        'id': user['id'],
+        'username': user['email'].split('@')[0],  # Use email prefix as username
+        'first_name': user.get('first_name', ''),
+        'last_name': user.get('last_name', ''),
+        'gender': user.get('gender'),
+        'age': user.get('age'),
+        'experience_level': user_gym_info.get('experience'),
+        'focus': user_gym_info.get('focus'),
+        'bio': user_gym_info.get('bio', ''),
+    }
+
+
+def parse_profile_age(value) -> Optional[int]:
+    """Numeric age, or None for missing/non-numeric/zero ages (which skip age filters)"""
+    try:
+        age = int(value) if value else None
+    except (TypeError, ValueError):
+        return None
+    return age or None
+
+
+# A posting set for index intersection: (size, membership test, ids)
+Posting = Tuple[int, Callable[[str], bool], Iterable[str]]
+
+# A search intersects postings directly when the smallest one has at most this many
+# ids; otherwise it walks the sequence order from the cursor (see take_page)
+MAX_INTERSECT = 1000
+
+
+def posting(ids) -> Posting:
+    """Posting for a set or dict of ids"""
+    return (len(ids), ids.__contains__, ids)
+
+
+def union_posting(first: Set[str], second: Set[str]) -> Posting:
+    """Posting matching ids in either of two disjoint sets"""
+    return (len(first) + len(second),
+            lambda item_id: item_id in first or item_id in second,
+            itertools.chain(first, second))
+
+
+class SeqOrder:
+    """
+    Ids by insertion sequence (or any other unique, orderable sort key), for
+    cursor paging. Discarded ids leave stale entries in the sorted sequence
+    list until enough pile up to compact it.
+    """
+
+    def __init__(self):
+        self._seqs: List = []  # sorted, may hold stale entries
+        self._ids: Dict = {}  # live seq -> id
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, seq, item_id: str) -> None:
+        if not self._seqs or seq > self._seqs[-1]:
+            self._seqs.append(seq)
+        else:
+            i = bisect.bisect_left(self._seqs, seq)
+            if i == len(self._seqs) or self._seqs[i] != seq:
+                self._seqs.insert(i, seq)
+        self._ids[seq] = item_id
+
+    def discard(self, seq) -> None:
+        if self._ids.pop(seq, None) is not None and len(self._seqs) > 2 * len(self._ids) + 64:
+            self._seqs = sorted(self._ids)
+
+    def after(self, after) -> Iterator[Tuple[object, str]]:
+        """(seq, id) of the live entries with a sequence greater than after, in order"""
+        seqs = self._seqs
+        i = 0 if after is None else bisect.bisect_right(seqs, after)
+        while i < len(seqs):
+            item_id = self._ids.get(seqs[i])
+            if item_id is not None:
+                yield seqs[i], item_id
+            i += 1
+
+    def clear(self) -> None:
+        self._seqs.clear()
+        self._ids.clear()
+
+
+def take_page(postings: List[Posting], order: SeqOrder, seq: Dict[str, int],
+              after: Optional[int], limit: Optional[int]) -> Tuple[List[str], Optional[int]]:
+    """
+    One page of the ids present in every posting, in sequence order after the given
+    sequence. Returns the page and the sequence to resume after (None on the last page).
+
+    A posting's ids may be a superset of what its membership test accepts (e.g.
+    location trigram candidates). If the smallest posting is small, its ids are
+    probed against every posting. Otherwise order is walked forward from the
+    cursor, probing each id until the page is full, so a page never scans the
+    matches before the cursor or after the page.
+    """
+    postings = sorted(postings, key=lambda p: p[0])
+    checks = [contains for _, contains, _ in postings]
+    if postings[0][0] <= MAX_INTERSECT:
+        ids = [item_id for item_id in postings[0][2]
+               if (after is None or seq[item_id] > after) and all(contains(item_id) for contains in checks)]
+        if limit is None:
+            return sorted(ids, key=seq.__getitem__), None
+        page = heapq.nsmallest(limit + 1, ids, key=seq.__getitem__)
+        if len(page) > limit:
+            return page[:limit], seq[page[limit - 1]]
+        return page, None
+
+    page = []
+    for item_seq, item_id in order.after(after):
+        if all(contains(item_id) for contains in checks):
+            if limit is not None and len(page) == limit:
+                return page, seq[page[-1]]
+            page.append(item_id)
+    return page, None
+
+
+class RWLock:
+    """
+    Readers-writer lock: many readers or one writer. Waiting writers hold off new
+    readers so a steady read load can't starve them. Both sides are reentrant for
+    the thread holding them, and a writer may also read, but a reader can't upgrade
+    to writing (that would deadlock against another upgrading reader).
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writers_waiting = 0
+        self._writer: Optional[int] = None  # thread ident of the writer
+        self._local = threading.local()  # this thread's read depth
+
+    @contextmanager
+    def read(self):
+        depth = getattr(self._local, 'depth', 0)
+        if depth or self._writer == threading.get_ident():
+            self._local.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._local.depth = depth
+            return
+        with self._cond:
+            while self._writer is not None or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        self._local.depth = 1
+        try:
+            yield
+        finally:
+            self._local.depth = 0
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        if self._writer == me:
+            yield
+            return
+        if getattr(self._local, 'depth', 0):
+            raise RuntimeError('Cannot take a write lock while holding a read lock')
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer is not None or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = me
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = None
+                self._cond.notify_all()
+
+
+def reads(method):
+    """Run a store method under the store's read lock"""
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self._lock.read():
+            return method(self, *args, **kwargs)
+    return locked
+
+
+def writes(method):
+    """Run a store method under the store's write lock, then bump the store's version"""
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self._lock.write():
+            result = method(self, *args, **kwargs)
+            self.version += 1
+            return result
+    return locked
+
+
+# One change in a store's change log: (record_id, op) with op 'insert', 'update' or 'delete'
+Change = Tuple[str, str]
+
+# Tombstones a change log keeps before pruning the oldest half
+MAX_TOMBSTONES = 10000
+
+
+class ChangeLog:
+    """
+    Latest change to each record of a store, in version order, for clients that
+    sync deltas instead of refetching. Only the newest change per record is kept,
+    so the log is bounded by the number of records plus retained tombstones.
+
+    Each change can be scoped to the users allowed to see it (None: everyone).
+    The owning store records changes under its write lock, tagged with the
+    version the write will end at (store.version + 1). A store starts its log's
+    floor at its initial version (see start_version).
+    """
+
+    def __init__(self, floor: int = 0, max_tombstones: int = MAX_TOMBSTONES):
+        self.max_tombstones = max_tombstones
+        # record_id -> (version, deleted, scope), oldest change first
+        self._latest: "OrderedDict[str, Tuple[int, bool, Optional[Tuple[str, ...]]]]" = OrderedDict()
+        self._created: Dict[str, int] = {}  # record_id -> version it was inserted at
+        self._tombstones = 0
+        # Changes at or before the floor may have been pruned; older clients must resync
+        self.floor = floor
+
+    def record(self, record_id: str, version: int, op: str, scope: Optional[Tuple[str, ...]] = None) -> None:
+        previous = self._latest.pop(record_id, None)
+        if previous is not None and previous[1]:
+            self._tombstones -= 1
+        deleted = op == 'delete'
+        self._latest[record_id] = (version, deleted, scope)
+        if op == 'insert':
+            self._created[record_id] = version
+        elif deleted:
+            self._created.pop(record_id, None)
+            self._tombstones += 1
+            if self._tombstones > self.max_tombstones:
+                self._prune()
+
+    def since(self, since: int, viewer: Optional[str] = None) -> List[Change]:
+        """Changes after version since that viewer may see, oldest first"""
+        changes = []
+        for record_id, (version, deleted, scope) in reversed(self._latest.items()):
+            if version <= since:
+                break
+            if scope is not None and viewer not in scope:
+                continue
+            if deleted:
+                op = 'delete'
+            else:
+                op = 'insert' if self._created.get(record_id, 0) > since else 'update'
+            changes.append((record_id, op))
+        changes.reverse()
+        return changes
+
+    def reset(self, version: int) -> None:
+        """Forget every change (the store was cleared); clients before version must resync"""
+        self._latest.clear()
+        self._created.clear()
+        self._tombstones = 0
+        self.floor = version
+
+    def _prune(self) -> None:
+        """Drop the oldest half of the tombstones, raising the floor past them"""
+        for record_id, (version, deleted, _) in list(self._latest.items()):
+            if self._tombstones <= self.max_tombstones // 2:
+                break
+            if deleted:
+                del self._latest[record_id]
+                self._tombstones -= 1
+                self.floor = version
+
+
+# Versions of stores with a change log are (epoch << EPOCH_SHIFT) + writes so far. The epoch is
+# drawn at random when the store is created, so a version from before a restart belongs to
+# another epoch and is refused rather than compared with this store's count.
+EPOCH_SHIFT = 32
+EPOCH_BITS = 21  # keeps versions below 2**53, which JavaScript clients read exactly
+
+
+def start_version() -> int:
+    """Initial version for a store with a change log: a new random epoch, no writes yet"""
+    return secrets.randbelow(1 << EPOCH_BITS) << EPOCH_SHIFT
+
+
+def changes_since(log: ChangeLog, version: int, since: int,
+                  viewer: Optional[str] = None) -> Tuple[Optional[List[Change]], int]:
+    """
+    (changes after version since, current version). The changes are None when
+    since predates pruned tombstones or isn't a version this store handed out
+    (e.g. from another epoch, before a restart); the client must then refetch everything.
+    """
+    if since >> EPOCH_SHIFT != version >> EPOCH_SHIFT or since < log.floor or since > version:
+        return None, version
+    return log.since(since, viewer), version
+
+
+def request_scope(interest_request: Dict) -> Tuple[str, str]:
+    """Users who may see changes to a request"""
+    return (interest_request['sender_id'], interest_request['receiver_id'])
+
+
+class UserStore:
+    """Users keyed by normalized email, with a user_id -> user index"""
+
+    def __init__(self):
+        self._lock = RWLock()
+        self.version = 0  # bumped by every write
+        self._by_email: Dict[str, Dict] = {}  # normalize_email(email) -> user
+        self._by_id: Dict[str, Dict] = {}  # user_id -> user (same dict objects)
+
+    @reads
+    def __len__(self) -> int:
+        return len(self._by_email)
+
+    @reads
+    def __contains__(self, email: str) -> bool:
+        return normalize_email(email) in self._by_email
+
+    @reads
+    def get_by_email(self, email: str) -> Optional[Dict]:
+        """User with this email, in any letter case"""
+        return self._by_email.get(normalize_email(email))
+
+    @reads
+    def get_by_id(self, user_id: str) -> Optional[Dict]:
+        return self._by_id.get(user_id)
+
+    @writes
+    def add(self, user: Dict) -> None:
+        """Insert a user (keyed by user['email'], normalized), replacing any previous record for that email"""
+        user = User.from_dict(user)
+        email = normalize_email(user['email'])
+        previous = self._by_email.get(email)
+        if previous is not None:
+            self.remove(previous['id'])
+        self._by_email[email] = user
+        self._by_id[user['id']] = user
+
+    @writes
+    def add_unique(self, user: Dict) -> bool:
+        """Insert a user unless one with the same email exists. Returns whether it was added."""
+        if normalize_email(user['email']) in self._by_email:
+            return False
+        self.add(user)
+        return True
+
+    @writes
+    def update(self, user_id: str, changes: Dict) -> Optional[Dict]:
+        """Apply field changes to a user. The email key itself is never changed here."""
+        user = self._by_id.get(user_id)
+        if user is None:
+            return None
+        user = User({**user, **{k: v for k, v in changes.items() if k not in ('id', 'email')}})
+        self._by_email[normalize_email(user['email'])] = user
+        self._by_id[user_id] = user
+        return user
+
+    @writes
+    def remove(self, user_id: str) -> Optional[Dict]:
+        """Remove a user by id, returning the removed record"""
+        user = self._by_id.pop(user_id, None)
+        if user is not None:
+            self._by_email.pop(normalize_email(user['email']), None)
+        return user
+
+    @reads
+    def values(self) -> Iterator[Dict]:
+        return iter(list(self._by_email.values()))
+
+    @reads
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        return iter(list(self._by_email.items()))
+
+    @writes
+    def clear(self) -> None:
+        self._by_email.clear()
+        self._by_id.clear()
+
+
+class GymInfoStore:
+    """Gym preferences (focus, experience, bio) keyed by user_id"""
+
+    def __init__(self):
+        self._lock = RWLock()
+        self.version = 0  # bumped by every write
+        self._by_user: Dict[str, Dict] = {}  # user_id -> gym info
+
+    @reads
+    def __len__(self) -> int:
+        return len(self._by_user)
+
+    @reads
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._by_user
+
+    @reads
+    def get(self, user_id: str) -> Optional[Dict]:
+        return self._by_user.get(user_id)
+
+    @writes
+    def update(self, user_id: str, changes: Dict) -> Dict:
+        """Apply field changes to a user's gym info (creating it if needed), returning the new record"""
+        gym_info = GymInfo({**self._by_user.get(user_id, {}), **changes, 'user_id': user_id})
+        self._by_user[user_id] = gym_info
+        return gym_info
+
+    @writes
+    def remove(self, user_id: str) -> Optional[Dict]:
+        return self._by_user.pop(user_id, None)
+
+    @writes
+    def clear(self) -> None:
+        self._by_user.clear()
+
+
+class PostStore:
+    """Posts keyed by id, with user, session-time and filter-field indexes"""
+
+    # Fields searchable by case-insensitive exact match
+    FILTER_FIELDS = ('workout_type', 'experience_level', 'party_size', 'gender_preference')
+
+    def __init__(self):
+        self._lock = RWLock()
+        self.version = start_version()  # bumped by every write
+        self._changes = ChangeLog(floor=self.version)
+        self._fragments = FragmentCache()  # encoded posts for list responses
+        self._by_id: Dict[str, Dict] = {}  # post_id -> post (insertion ordered)
+        self._by_user: Dict[str, Dict[str, Dict]] = {}  # user_id -> {post_id: post}
+        self._seq: Dict[str, int] = {}  # post_id -> insertion sequence, for stable ordering
+        self._next_seq = 0
+        self._order = SeqOrder()  # upcoming posts by sequence, for paging
+        # field -> normalized value -> post_ids, plus each post's current keys
+        self._field_index: Dict[str, Dict[str, Set[str]]] = {field: {} for field in self.FILTER_FIELDS}
+        self._field_keys: Dict[str, Dict[str, str]] = {}
+        # Lowercased locations and a trigram -> post_ids index for substring search
+        self._locations: Dict[str, str] = {}
+        self._trigram_index: Dict[str, Set[str]] = {}
+        # Session start times are parsed once on write. Posts stay in _upcoming until
+        # their start time passes; the heap lets a read evict only what just expired.
+        self._starts: Dict[str, Optional[datetime]] = {}  # post_id -> parsed date_time
+        self._upcoming: Dict[str, Dict] = {}  # post_id -> post, not yet started
+        self._expiry_heap: List[Tuple[datetime, str]] = []  # (start, post_id), may hold stale entries
+
+    @reads
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    @reads
+    def __contains__(self, post_id: str) -> bool:
+        return post_id in self._by_id
+
+    @reads
+    def get(self, post_id: str) -> Optional[Dict]:
+        return self._by_id.get(post_id)
+
+    @writes
+    def add(self, post: Dict) -> Dict:
+        """Insert a post, replacing any previous post with the same id. Returns the stored record."""
+        post = Post.from_dict(post)
+        if post['id'] in self._by_id:
+            self.remove(post['id'])
+        self._by_id[post['id']] = post
+        self._by_user.setdefault(post['user_id'], {})[post['id']] = post
+        self._seq[post['id']] = self._next_seq
+        self._next_seq += 1
+        self._field_keys[post['id']] = {}
+        self._index_fields(post, self.FILTER_FIELDS)
+        self._index_location(post)
+        self._schedule(post)
+        self._changes.record(post['id'], self.version + 1, 'insert')
+        return post
+
+    @writes
+    def update(self, post_id: str, changes: Dict) -> Optional[Dict]:
+        """Apply field changes to a post. Ownership (id, user_id) is never changed here."""
+        post = self._by_id.get(post_id)
+        if post is None:
+            return None
+        changes = {k: v for k, v in changes.items() if k not in ('id', 'user_id')}
+        post = Post({**post, **changes})
+        self._by_id[post_id] = post
+        self._fragments.discard(post_id)
+        self._by_user[post['user_id']][post_id] = post
+        if post_id in self._upcoming:
+            self._upcoming[post_id] = post
+        self._index_fields(post, [field for field in self.FILTER_FIELDS if field in changes])
+        if 'location' in changes:
+            self._index_location(post)
+        if 'date_time' in changes:
+            self._schedule(post)
+        self._changes.record(post_id, self.version + 1, 'update')
+        return post
+
+    @writes
+    def remove(self, post_id: str) -> Optional[Dict]:
+        """Remove a post by id, returning the removed record"""
+        post = self._by_id.pop(post_id, None)
+        if post is None:
+            return None
+        self._fragments.discard(post_id)
+        self._starts.pop(post_id, None)
+        self._upcoming.pop(post_id, None)
+        self._order.discard(self._seq.pop(post_id))
+        for field, key in self._field_keys.pop(post_id, {}).items():
+            self._discard_posting(field, key, post_id)
+        self._unindex_location(post_id)
+        user_posts = self._by_user.get(post['user_id'])
+        if user_posts is not None:
+            user_posts.pop(post_id, None)
+            if not user_posts:
+                del self._by_user[post['user_id']]
+        self._changes.record(post_id, self.version + 1, 'delete')
+        return post
+
+    @writes
+    def remove_by_user(self, user_id: str) -> List[Dict]:
+        """Remove every post owned by a user, returning the removed records"""
+        removed = list(self._by_user.get(user_id, {}).values())
+        for post in removed:
+            self.remove(post['id'])
+        return removed
+
+    @reads
+    def by_user(self, user_id: str) -> List[Dict]:
+        return list(self._by_user.get(user_id, {}).values())
+
+    @reads
+    def values(self) -> List[Dict]:
+        return list(self._by_id.values())
+
+    @reads
+    def changes(self, since: int) -> Tuple[Optional[List[Change]], int]:
+        """(changes after version since, current version); see changes_since"""
+        return changes_since(self._changes, self.version, since)
+
+    def encoded(self, posts: List[Dict]) -> List[bytes]:
+        """JSON encoding of each post, reused until the post changes"""
+        return self._fragments.encode_all(posts, self._by_id.get)
+
+    def upcoming(self, now: Optional[datetime] = None) -> List[Dict]:
+        """Posts whose session hasn't started yet (posts with unparseable times are kept)"""
+        self._expire_due(now or datetime.now())
+        with self._lock.read():
+            return list(self._upcoming.values())
+
+    def search(self, filters: Dict[str, str], location: Optional[str] = None,
+               after: Optional[int] = None, limit: Optional[int] = None,
+               now: Optional[datetime] = None) -> Tuple[List[Dict], Optional[int]]:
+        """
+        Upcoming posts matching every given filter, in insertion order.
+
+        Returns (page, next_after): at most limit posts with a sequence number
+        greater than after, and the sequence to resume from (None on the last page).
+
+        filters maps FILTER_FIELDS to the requested value (case-insensitive exact
+        match). A gender_preference filter also matches posts without a preference.
+        location is a case-insensitive substring filter, answered from the trigram
+        index and verified against the full location.
+        """
+        self._expire_due(now or datetime.now())
+        with self._lock.read():
+            return self._search(filters, location, after, limit)
+
+    def _search(self, filters: Dict[str, str], location: Optional[str],
+                after: Optional[int], limit: Optional[int]) -> Tuple[List[Dict], Optional[int]]:
+        postings = [posting(self._upcoming)]
+        for field, value in filters.items():
+            if not value:
+                continue
+            matches = self._field_index[field].get(normalize_filter_value(value), set())
+            if field == 'gender_preference':
+                postings.append(union_posting(matches, self._field_index[field].get('', set())))
+            else:
+                postings.append(posting(matches))
+        needle = location.lower() if location else ''
+        if needle:
+            postings.append(self._location_posting(needle))
+
+        page_ids, next_after = take_page(postings, self._order, self._seq, after, limit)
+        return [self._by_id[pid] for pid in page_ids], next_after
+
+    @writes
+    def clear(self) -> None:
+        self._by_id.clear()
+        self._by_user.clear()
+        self._seq.clear()
+        self._order.clear()
+        self._field_keys.clear()
+        for field_index in self._field_index.values():
+            field_index.clear()
+        self._locations.clear()
+        self._trigram_index.clear()
+        self._starts.clear()
+        self._upcoming.clear()
+        self._expiry_heap.clear()
+        self._fragments.clear()
+        self._changes.reset(self.version + 1)
+
+    def _index_fields(self, post: Dict, fields: Iterable[str]) -> None:
+        """Move a post into the posting sets for its current values of the given fields"""
+        keys = self._field_keys[post['id']]
+        for field in fields:
+            key = normalize_filter_value(post.get(field))
+            old_key = keys.get(field)
+            if old_key == key:
+                continue
+            if old_key is not None:
+                self._discard_posting(field, old_key, post['id'])
+            self._field_index[field].setdefault(key, set()).add(post['id'])
+            keys[field] = key
+
+    def _discard_posting(self, field: str, key: str, post_id: str) -> None:
+        bucket = self._field_index[field].get(key)
+        if bucket is not None:
+            bucket.discard(post_id)
+            if not bucket:
+                del self._field_index[field][key]
+
+    def _index_location(self, post: Dict) -> None:
+        """(Re)index a post's lowercased location trigrams"""
+        location = normalize_filter_value(post.get('location'))
+        if self._locations.get(post['id']) == location:
+            return
+        self._unindex_location(post['id'])
+        self._locations[post['id']] = location
+        for gram in trigrams(location):
+            self._trigram_index.setdefault(gram, set()).add(post['id'])
+
+    def _unindex_location(self, post_id: str) -> None:
+        location = self._locations.pop(post_id, None)
+        if location is None:
+            return
+        for gram in trigrams(location):
+            bucket = self._trigram_index.get(gram)
+            if bucket is not None:
+                bucket.discard(post_id)
+                if not bucket:
+                    del self._trigram_index[gram]
+
+    def _location_posting(self, needle: str) -> Posting:
+        """
+        Posting for locations containing needle. Its ids are the smallest trigram
+        bucket of needle, candidates only; membership checks the substring itself.
+        """
+        def contains(post_id: str) -> bool:
+            return needle in self._locations.get(post_id, '')
+        if len(needle) < 3:
+            return (len(self._locations), contains, self._locations)
+        bucket = min((self._trigram_index.get(gram, set()) for gram in trigrams(needle)), key=len)
+        return (len(bucket), contains, bucket)
+
+    def _schedule(self, post: Dict) -> None:
+        """(Re)index a post's start time and mark it upcoming until that time passes"""
+        start = parse_session_time(post.get('date_time'))
+        self._starts[post['id']] = start
+        self._upcoming[post['id']] = post
+        self._order.add(self._seq[post['id']], post['id'])
+        if start is not None:
+            heapq.heappush(self._expiry_heap, (start, post['id']))
+            # Drop stale heap entries left behind by edits and deletes
+            if len(self._expiry_heap) > 2 * len(self._starts) + 64:
+                self._expiry_heap = [(t, pid) for pid, t in self._starts.items() if t is not None]
+                heapq.heapify(self._expiry_heap)
+
+    @reads
+    def next_expiry(self) -> Optional[datetime]:
+        """Earliest time an upcoming post may start (and drop out of search results)"""
+        return self._expiry_heap[0][0] if self._expiry_heap else None
+
+    def _expire_due(self, now: datetime) -> None:
+        """Take the write lock to evict started posts, but only when some are due"""
+        with self._lock.read():
+            due = bool(self._expiry_heap) and self._expiry_heap[0][0] <= now
+        if due:
+            with self._lock.write():
+                self._expire(now)
+
+    def _expire(self, now: datetime) -> None:
+        """Evict posts whose start time is at or before now"""
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            start, post_id = heapq.heappop(heap)
+            # Entries are only authoritative if the post still has this start time
+            if self._starts.get(post_id) == start and self._upcoming.pop(post_id, None) is not None:
+                self._order.discard(self._seq[post_id])
+
+
+RequestKey = Tuple[str, str, str, Optional[str]]  # (sender_id, receiver_id, type, post_id)
+
+
+def request_key(interest_request: Dict) -> RequestKey:
+    """Identity of a request for duplicate detection"""
+    return (interest_request['sender_id'], interest_request['receiver_id'],
+            interest_request['type'], interest_request.get('post_id'))
+
+
+def request_sort_key(interest_request: Dict) -> Tuple[str, str]:
+    """Stable inbox ordering for interest requests: oldest first"""
+    created_at = interest_request.get('created_at') or ''
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()  # Cursors carry the key as JSON strings
+    return (created_at, interest_request['id'])
+
+
+class RequestStore:
+    """Interest/join requests keyed by id, with participant and duplicate-detection indexes"""
+
+    def __init__(self):
+        self._lock = RWLock()
+        self.version = start_version()  # bumped by every write
+        self._changes = ChangeLog(floor=self.version)
+        self._by_id: Dict[str, Dict] = {}  # request_id -> request (insertion ordered)
+        self._by_receiver: Dict[str, Dict[str, Dict]] = {}  # receiver_id -> {request_id: request}
+        self._by_sender: Dict[str, Dict[str, Dict]] = {}  # sender_id -> {request_id: request}
+        # 'received'/'sent' -> user_id -> their requests in request_sort_key order
+        self._order: Dict[str, Dict[str, SeqOrder]] = {'received': {}, 'sent': {}}
+        self._by_key: Dict[RequestKey, str] = {}  # request_key -> request_id
+
+    @reads
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    @reads
+    def get(self, request_id: str) -> Optional[Dict]:
+        return self._by_id.get(request_id)
+
+    @writes
+    def add(self, interest_request: Dict) -> None:
+        """Insert a request, replacing any previous request with the same id"""
+        interest_request = InterestRequest.from_dict(interest_request)
+        if interest_request['id'] in self._by_id:
+            self.remove(interest_request['id'])
+        self._by_id[interest_request['id']] = interest_request
+        self._by_receiver.setdefault(interest_request['receiver_id'], {})[interest_request['id']] = interest_request
+        self._by_sender.setdefault(interest_request['sender_id'], {})[interest_request['id']] = interest_request
+        self._index_order(interest_request)
+        self._by_key[request_key(interest_request)] = interest_request['id']
+        self._changes.record(interest_request['id'], self.version + 1, 'insert', request_scope(interest_request))
+
+    @writes
+    def add_unique(self, interest_request: Dict) -> bool:
+        """Insert a request unless an identical one (see request_key) exists. Returns whether it was added."""
+        if request_key(interest_request) in self._by_key:
+            return False
+        self.add(interest_request)
+        return True
+
+    @writes
+    def update(self, request_id: str, changes: Dict) -> Optional[Dict]:
+        """Apply field changes (e.g. status) to a request. Participants are never changed here."""
+        interest_request = self._by_id.get(request_id)
+        if interest_request is None:
+            return None
+        changes = {k: v for k, v in changes.items() if k not in ('id', 'sender_id', 'receiver_id')}
+        previous, interest_request = interest_request, InterestRequest({**interest_request, **changes})
+        if request_sort_key(interest_request) != request_sort_key(previous):
+            self._unindex_order(previous)
+            self._index_order(interest_request)
+        self._by_id[request_id] = interest_request
+        self._by_receiver[interest_request['receiver_id']][request_id] = interest_request
+        self._by_sender[interest_request['sender_id']][request_id] = interest_request
+        self._changes.record(request_id, self.version + 1, 'update', request_scope(interest_request))
+        return interest_request
+
+    @writes
+    def remove(self, request_id: str) -> Optional[Dict]:
+        """Remove a request by id, returning the removed record"""
+        interest_request = self._by_id.pop(request_id, None)
+        if interest_request is None:
+            return None
+        key = request_key(interest_request)
+        if self._by_key.get(key) == request_id:
+            del self._by_key[key]
+        self._unindex_order(interest_request)
+        for index, user_id in ((self._by_receiver, interest_request['receiver_id']),
+                               (self._by_sender, interest_request['sender_id'])):
+            user_requests = index.get(user_id)
+            if user_requests is not None:
+                user_requests.pop(request_id, None)
+                if not user_requests:
+                    del index[user_id]
+        self._changes.record(request_id, self.version + 1, 'delete', request_scope(interest_request))
+        return interest_request
+
+    @writes
+    def remove_for_user(self, user_id: str) -> List[Dict]:
+        """Remove every request a user sent or received, returning the removed records"""
+        removed = list({**self._by_receiver.get(user_id, {}), **self._by_sender.get(user_id, {})}.values())
+        for interest_request in removed:
+            self.remove(interest_request['id'])
+        return removed
+
+    @reads
+    def received(self, user_id: str) -> List[Dict]:
+        return list(self._by_receiver.get(user_id, {}).values())
+
+    @reads
+    def sent(self, user_id: str) -> List[Dict]:
+        return list(self._by_sender.get(user_id, {}).values())
+
+    @reads
+    def page(self, box: str, user_id: str, after: Optional[Tuple[str, str]], limit: int,
+             where: Optional[Callable[[Dict], bool]] = None) -> Tuple[List[Dict], Optional[Tuple[str, str]]]:
+        """
+        One page of the requests user_id received or sent (box 'received' or 'sent')
+        that pass where, in request_sort_key order after the given key. Returns the
+        page and the key to resume after (None on the last page). The box is walked
+        from the cursor, so a page never scans the requests before it.
+        """
+        page = []
+        order = self._order[box].get(user_id)
+        if order is not None:
+            for _, request_id in order.after(after):
+                interest_request = self._by_id[request_id]
+                if where is None or where(interest_request):
+                    if len(page) == limit:
+                        return page, request_sort_key(page[-1])
+                    page.append(interest_request)
+        return page, None
+
+    @reads
+    def values(self) -> List[Dict]:
+        return list(self._by_id.values())
+
+    @reads
+    def changes(self, since: int, user_id: str) -> Tuple[Optional[List[Change]], int]:
+        """Changes to requests user_id sent or received; see changes_since"""
+        return changes_since(self._changes, self.version, since, user_id)
+
+    @writes
+    def clear(self) -> None:
+        self._by_id.clear()
+        self._by_receiver.clear()
+        self._by_sender.clear()
+        self._order = {'received': {}, 'sent': {}}
+        self._by_key.clear()
+        self._changes.reset(self.version + 1)
+
+    def _index_order(self, interest_request: Dict) -> None:
+        key = request_sort_key(interest_request)
+        for box, user_id in (('received', interest_request['receiver_id']), ('sent', interest_request['sender_id'])):
+            self._order[box].setdefault(user_id, SeqOrder()).add(key, interest_request['id'])
+
+    def _unindex_order(self, interest_request: Dict) -> None:
+        key = request_sort_key(interest_request)
+        for box, user_id in (('received', interest_request['receiver_id']), ('sent', interest_request['sender_id'])):
+            order = self._order[box].get(user_id)
+            if order is not None:
+                order.discard(key)
+                if not order:
+                    del self._order[box][user_id]
+
+
+class ProfileStore:
+    """
+    Materialized public profiles (user record merged with gym info), with facet
+    indexes on gender/experience_level/focus and an age-sorted index.
+
+    Call refresh(user_id) whenever a user's record or gym info changes.
+    """
+
+    FACET_FIELDS = ('gender', 'experience_level', 'focus')
+
+    def __init__(self, users: UserStore, gym_info: GymInfoStore):
+        self._lock = RWLock()
+        self.version = start_version()  # bumped by every write
+        self._changes = ChangeLog(floor=self.version)
+        self._fragments = FragmentCache()  # encoded profiles for list responses
+        self._users = users
+        self._gym_info = gym_info
+        self._by_id: Dict[str, Dict] = {}  # user_id -> profile
+        self._seq: Dict[str, int] = {}  # user_id -> insertion sequence, for stable paging
+        self._next_seq = 0
+        self._order = SeqOrder()  # profiles by sequence, for paging
+        # field -> value -> user_ids; missing values are indexed under None
+        self._facets: Dict[str, Dict[Optional[str], Set[str]]] = {field: {} for field in self.FACET_FIELDS}
+        self._ages: List[Tuple[int, str]] = []  # (age, user_id), sorted
+        self._ageless: Set[str] = set()  # profiles without a usable age
+
+    @reads
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    @reads
+    def get(self, user_id: str) -> Optional[Dict]:
+        return self._by_id.get(user_id)
+
+    @writes
+    def refresh(self, user_id: str) -> Optional[Dict]:
+        """Rebuild a user's profile from the user and gym info stores"""
+        user = self._users.get_by_id(user_id)
+        if user is None:
+            self.remove(user_id)
+            return None
+        profile = build_profile(user, self._gym_info.get(user_id) or {})
+        previous = self._by_id.get(user_id)
+        if previous is not None:
+            self._unindex(previous)
+        else:
+            self._seq[user_id] = self._next_seq
+            self._order.add(self._next_seq, user_id)
+            self._next_seq += 1
+        self._by_id[user_id] = profile
+        self._fragments.discard(user_id)
+        self._index(profile)
+        self._changes.record(user_id, self.version + 1, 'update' if previous is not None else 'insert')
+        return profile
+
+    @writes
+    def remove(self, user_id: str) -> Optional[Dict]:
+        profile = self._by_id.pop(user_id, None)
+        if profile is not None:
+            self._unindex(profile)
+            self._order.discard(self._seq.pop(user_id))
+            self._fragments.discard(user_id)
+            self._changes.record(user_id, self.version + 1, 'delete')
+        return profile
+
+    @reads
+    def search(self, filters: Dict[str, str], same_gender_as: Optional[str] = None,
+               age_min: Optional[int] = None, age_max: Optional[int] = None,
+               exclude_id: Optional[str] = None, after: Optional[int] = None,
+               limit: Optional[int] = None) -> Tuple[List[Dict], Optional[int]]:
+        """
+        Profiles matching every given filter, in insertion order.
+
+        filters maps FACET_FIELDS to a required value; profiles missing that field
+        still match. same_gender_as only matches profiles with exactly that gender.
+        Profiles without a numeric age pass the age range. Returns (page, next_after)
+        like PostStore.search.
+        """
+        postings = [(len(self._by_id), lambda user_id: user_id in self._by_id and user_id != exclude_id, self._by_id)]
+        for field, value in filters.items():
+            if not value:
+                continue
+            facet = self._facets[field]
+            postings.append(union_posting(facet.get(value, set()), facet.get(None, set())))
+        if same_gender_as:
+            postings.append(posting(self._facets['gender'].get(same_gender_as, set())))
+        if age_min is not None or age_max is not None:
+            postings.append(self._age_posting(age_min, age_max))
+
+        page_ids, next_after = take_page(postings, self._order, self._seq, after, limit)
+        return [self._by_id[user_id] for user_id in page_ids], next_after
+
+    def _age_posting(self, age_min: Optional[int], age_max: Optional[int]) -> Posting:
+        """Posting for profiles in the age range, plus those without an age"""
+        lo = 0 if age_min is None else bisect.bisect_left(self._ages, (age_min,))
+        hi = len(self._ages) if age_max is None else bisect.bisect_left(self._ages, (age_max + 1,))
+
+        def contains(user_id: str) -> bool:
+            if user_id in self._ageless:
+                return True
+            age = parse_profile_age(self._by_id[user_id]['age'])
+            return (age_min is None or age >= age_min) and (age_max is None or age <= age_max)
+        in_range = (self._ages[i][1] for i in range(lo, hi))
+        return (hi - lo + len(self._ageless), contains, itertools.chain(in_range, self._ageless))
+
+    @reads
+    def changes(self, since: int) -> Tuple[Optional[List[Change]], int]:
+        """(changes after version since, current version); see changes_since"""
+        return changes_since(self._changes, self.version, since)
+
+    def encoded(self, profiles: List[Dict]) -> List[bytes]:
+        """JSON encoding of each profile, reused until the profile changes"""
+        return self._fragments.encode_all(profiles, self._by_id.get)
+
+    @writes
+    def clear(self) -> None:
+        self._by_id.clear()
+        self._seq.clear()
+        self._order.clear()
+        self._fragments.clear()
+        for facet in self._facets.values():
+            facet.clear()
+        self._ages.clear()
+        self._ageless.clear()
+        self._changes.reset(self.version + 1)
+
+    def _index(self, profile: Dict) -> None:
+        for field in self.FACET_FIELDS:
+            self._facets[field].setdefault(profile[field] or None, set()).add(profile['id'])
+        age = parse_profile_age(profile['age'])
+        if age is None:
+            self._ageless.add(profile['id'])
+        else:
+            bisect.insort(self._ages, (age, profile['id']))
+
+    def _unindex(self, profile: Dict) -> None:
+        for field in self.FACET_FIELDS:
+            key = profile[field] or None
+            bucket = self._facets[field].get(key)
+            if bucket is not None:
+                bucket.discard(profile['id'])
+                if not bucket:
+                    del self._facets[field][key]
+        age = parse_profile_age(profile['age'])
+        if age is None:
+            self._ageless.discard(profile['id'])
+        else:
+            i = bisect.bisect_left(self._ages, (age, profile['id']))
+            if i < len(self._ages) and self._ages[i] == (age, profile['id']):
+                del self._ages[i]
+
+
+class SessionStore:
+    """Session tokens with an expiry time, a user_id -> tokens index and a per-user cap"""
+
+    def __init__(self, ttl: timedelta = timedelta(days=7), max_per_user: int = 10):
+        self._lock = RWLock()
+        self.version = 0  # bumped by every write
+        self.ttl = ttl
+        self.max_per_user = max_per_user
+        self._by_token: Dict[str, Tuple[str, datetime]] = {}  # token -> (user_id, expires_at)
+        self._by_user: Dict[str, Dict[str, datetime]] = {}  # user_id -> {token: expires_at}, oldest first
+        self._expiry_heap: List[Tuple[datetime, str]] = []  # (expires_at, token), may hold stale entries
+
+    @reads
+    def __len__(self) -> int:
+        return len(self._by_token)
+
+    def __contains__(self, token: str) -> bool:
+        return self.get(token) is not None
+
+    def get(self, token: str, now: Optional[datetime] = None) -> Optional[str]:
+        """user_id for a live token (an expired token is evicted on lookup)"""
+        with self._lock.read():
+            session = self._by_token.get(token)
+        if session is None:
+            return None
+        if session[1] <= (now or datetime.now()):
+            self.remove(token)
+            return None
+        return session[0]
+
+    @writes
+    def add(self, token: str, user_id: str, now: Optional[datetime] = None) -> None:
+        """Start a session, dropping the user's oldest sessions beyond max_per_user"""
+        now = now or datetime.now()
+        self.expire(now)
+        if token in self._by_token:
+            self.remove(token)
+        expires_at = now + self.ttl
+        self._by_token[token] = (user_id, expires_at)
+        user_tokens = self._by_user.setdefault(user_id, {})
+        user_tokens[token] = expires_at
+        while len(user_tokens) > self.max_per_user:
+            self.remove(next(iter(user_tokens)))
+        heapq.heappush(self._expiry_heap, (expires_at, token))
+        # Drop stale heap entries left behind by logouts and revocations
+        if len(self._expiry_heap) > 2 * len(self._by_token) + 64:
+            self._expiry_heap = [(expires_at, t) for t, (_, expires_at) in self._by_token.items()]
+            heapq.heapify(self._expiry_heap)
+
+    @writes
+    def take(self, token: str, now: Optional[datetime] = None) -> Optional[str]:
+        """Remove a token and return its user_id if it was live (for single-use tokens)"""
+        session = self._by_token.get(token)
+        if session is None:
+            return None
+        self.remove(token)
+        return session[0] if session[1] > (now or datetime.now()) else None
+
+    @writes
+    def remove(self, token: str) -> Optional[str]:
+        """End a session, returning its user_id"""
+        session = self._by_token.pop(token, None)
+        if session is None:
+            return None
+        user_tokens = self._by_user.get(session[0])
+        if user_tokens is not None:
+            user_tokens.pop(token, None)
+            if not user_tokens:
+                del self._by_user[session[0]]
+        return session[0]
+
+    @writes
+    def remove_for_user(self, user_id: str) -> List[str]:
+        """End every session a user has, returning the revoked tokens"""
+        tokens = list(self._by_user.pop(user_id, {}))
+        for token in tokens:
+            self._by_token.pop(token, None)
+        return tokens
+
+    @writes
+    def expire(self, now: Optional[datetime] = None) -> None:
+        """Evict sessions whose expiry is at or before now"""
+        now = now or datetime.now()
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            expires_at, token = heapq.heappop(heap)
+            session = self._by_token.get(token)
+            if session is not None and session[1] == expires_at:
+                self.remove(token)
+
+    @writes
+    def clear(self) -> None:
+        self._by_token.clear()
+        self._by_user.clear()
+        self._expiry_heap.clear()
+
+
+class VerificationTokenStore:
+    """Email verification tokens with an expiry time and at most one live token per user"""
+
+    def __init__(self, ttl: timedelta = timedelta(hours=48)):
+        self._lock = RWLock()
+        self.version = 0  # bumped by every write
+        self.ttl = ttl
+        self._by_token: Dict[str, Dict] = {}  # token -> {user_id, email, created_at}
+        self._expires: Dict[str, datetime] = {}  # token -> expires_at
+        self._by_user: Dict[str, str] = {}  # user_id -> token
+        self._expiry_heap: List[Tuple[datetime, str]] = []  # (expires_at, token), may hold stale entries
+
+    @reads
+    def __len__(self) -> int:
+        return len(self._by_token)
+
+    def __contains__(self, token: str) -> bool:
+        return self.get(token) is not None
+
+    def get(self, token: str, now: Optional[datetime] = None) -> Optional[Dict]:
+        """Record for a live token (an expired token is evicted on lookup)"""
+        with self._lock.read():
+            record = self._by_token.get(token)
+            expires_at = self._expires.get(token)
+        if record is None:
+            return None
+        if expires_at <= (now or datetime.now()):
+            self.remove(token)
+            return None
+        return record
+
+    @writes
+    def issue(self, token: str, user_id: str, email: str, now: Optional[datetime] = None) -> Dict:
+        """Store a new token for a user, retiring any token they were issued before"""
+        now = now or datetime.now()
+        self.expire(now)
+        self.remove_for_user(user_id)
+        record = {'user_id': user_id, 'email': email, 'created_at': now.isoformat()}
+        self._by_token[token] = record
+        self._expires[token] = now + self.ttl
+        self._by_user[user_id] = token
+        heapq.heappush(self._expiry_heap, (now + self.ttl, token))
+        # Drop stale heap entries left behind by reissued and used tokens
+        if len(self._expiry_heap) > 2 * len(self._expires) + 64:
+            self._expiry_heap = [(expires_at, t) for t, expires_at in self._expires.items()]
+            heapq.heapify(self._expiry_heap)
+        return record
+
+    @writes
+    def remove(self, token: str) -> Optional[Dict]:
+        """Retire a token, returning its record"""
+        record = self._by_token.pop(token, None)
+        if record is None:
+            return None
+        del self._expires[token]
+        if self._by_user.get(record['user_id']) == token:
+            del self._by_user[record['user_id']]
+        return record
+
+    @writes
+    def remove_for_user(self, user_id: str) -> Optional[Dict]:
+        token = self._by_user.get(user_id)
+        return self.remove(token) if token is not None else None
+
+    @writes
+    def expire(self, now: Optional[datetime] = None) -> None:
+        """Evict tokens whose expiry is at or before now"""
+        now = now or datetime.now()
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            expires_at, token = heapq.heappop(heap)
+            if self._expires.get(token) == expires_at:
+                self.remove(token)
+
+    @writes
+    def clear(self) -> None:
+        self._by_token.clear()
+        self._expires.clear()
+        self._by_user.clear()
+        self._expiry_heap.clear()
+
+
+class RevocationList:
+    """Revoked session keys, each kept only until the tokens it covers would have expired anyway"""
+
+    def __init__(self):
+        self._lock = RWLock()
+        self.version = 0  # bumped by every write
+        self._entries: Dict[str, Tuple[datetime, datetime]] = {}  # key -> (revoked_at, expires_at)
+        self._expiry_heap: List[Tuple[datetime, str]] = []  # (expires_at, key), may hold stale entries
+
+    @reads
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @writes
+    def revoke(self, key: str, expires_at: datetime, now: Optional[datetime] = None) -> None:
+        now = now or datetime.now()
+        self.expire(now)
+        self._entries[key] = (now, expires_at)
+        heapq.heappush(self._expiry_heap, (expires_at, key))
+
+    @reads
+    def revoked_at(self, key: str) -> Optional[datetime]:
+        """When key was revoked, or None if it isn't (or no longer needs to be)"""
+        entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+
+    @writes
+    def expire(self, now: Optional[datetime] = None) -> None:
+        """Forget revocations whose tokens have all expired"""
+        now = now or datetime.now()
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            expires_at, key = heapq.heappop(heap)
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == expires_at:
+                del self._entries[key]
+
+    @writes
+    def clear(self) -> None:
+        self._entries.clear()
+        self._expiry_heap.clear()
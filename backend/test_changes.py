@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-memory change logs (python -m pytest test_changes.py)
+Checks the deltas a client gets, and that a version from before a restart asks it to resync
+"""
+import pytest
+
+from stores import EPOCH_SHIFT, GymInfoStore, PostStore, ProfileStore, RequestStore, UserStore
+
+
+def add_post(posts: PostStore, post_id: str = 'post1') -> None:
+    posts.add({'id': post_id, 'user_id': 'user1', 'date_time': '2099-01-01T10:00'})
+
+
+def add_request(requests: RequestStore, request_id: str = 'request1') -> None:
+    requests.add({'id': request_id, 'sender_id': 'user1', 'receiver_id': 'user2', 'type': 'profile',
+                  'status': 'pending'})
+
+
+def post_store():
+    posts = PostStore()
+    return posts, lambda: add_post(posts), ()
+
+
+def request_store():
+    requests = RequestStore()
+    return requests, lambda: add_request(requests), ('user1',)
+
+
+def profile_store():
+    users = UserStore()
+    profiles = ProfileStore(users, GymInfoStore())
+
+    def add_profile():
+        users.add({'id': 'user1', 'email': 'user1@university.edu', 'first_name': 'Test'})
+        profiles.refresh('user1')
+    return profiles, add_profile, ()
+
+
+# Each returns (new store, a function making one write to it, extra arguments to changes())
+STORES = {'posts': post_store, 'requests': request_store, 'profiles': profile_store}
+
+
+def test_changes_since_a_version():
+    posts = PostStore()
+    add_post(posts)
+    changes, version = posts.changes(posts.version - 1)
+    assert changes == [('post1', 'insert')]
+    assert posts.changes(version) == ([], version)
+
+
+def test_changes_report_the_latest_op_per_record():
+    posts = PostStore()
+    add_post(posts)
+    after_insert = posts.version
+    posts.update('post1', {'title': 'Leg day'})
+    add_post(posts, 'post2')
+    posts.remove('post2')
+    assert posts.changes(after_insert - 1)[0] == [('post1', 'insert'), ('post2', 'delete')]
+    assert posts.changes(after_insert)[0] == [('post1', 'update'), ('post2', 'delete')]
+
+
+def test_requests_changes_are_only_shown_to_participants():
+    requests = RequestStore()
+    start = requests.version
+    add_request(requests)
+    assert requests.changes(start, 'user2')[0] == [('request1', 'insert')]
+    assert requests.changes(start, 'user3')[0] == []
+
+
+@pytest.mark.parametrize('name', STORES)
+def test_version_from_before_a_restart_resets(name):
+    old, write, args = STORES[name]()
+    write()
+    # A new store stands in for the restarted server
+    store, _, _ = STORES[name]()
+    changes, version = store.changes(old.version, *args)
+    assert changes is None
+    assert version == store.version
+    # A client that synced with this store gets deltas as usual
+    assert store.changes(store.version, *args) == ([], store.version)
+
+
+@pytest.mark.parametrize('name', STORES)
+def test_version_from_another_epoch_resets(name):
+    store, write, args = STORES[name]()
+    write()
+    # Same number of writes, different epoch: not a version this store handed out
+    changes, _ = store.changes(store.version ^ (1 << EPOCH_SHIFT), *args)
+    assert changes is None
+
+
+@pytest.mark.parametrize('name', STORES)
+def test_version_from_a_store_started_alongside_resets(name):
+    # Clock-based versions let this through when both stores started in the same millisecond
+    other, write_other, args = STORES[name]()
+    store, write, _ = STORES[name]()
+    write_other()
+    write()
+    write()
+    changes, _ = store.changes(other.version, *args)
+    assert changes is None
+
+
+def test_clear_resets_clients_from_before_it():
+    posts = PostStore()
+    add_post(posts)
+    before = posts.version
+    posts.clear()
+    assert posts.changes(before)[0] is None
+    assert posts.changes(posts.version) == ([], posts.version)
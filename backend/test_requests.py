@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Tests for paging a user's request boxes (python -m pytest test_requests.py)
+Pages must follow request_sort_key order whatever order requests were added in
+"""
+import pytest
+
+from sqlite_stores import SQLiteDatabase, SQLiteRequestStore
+from stores import RequestStore, request_sort_key
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def requests(request, tmp_path):
+    if request.param == 'memory':
+        return RequestStore()
+    return SQLiteRequestStore(SQLiteDatabase(str(tmp_path / 'requests.db')))
+
+
+def add_request(requests, request_id: str, created_at: str, status: str = 'pending') -> None:
+    requests.add({'id': request_id, 'sender_id': 'user2', 'receiver_id': 'user1', 'type': 'profile',
+                  'status': status, 'created_at': created_at})
+
+
+def all_pages(requests, box: str, limit: int, where=None):
+    ids, after = [], None
+    while True:
+        page, after = requests.page(box, 'user1' if box == 'received' else 'user2', after, limit, where)
+        ids.append([r['id'] for r in page])
+        if after is None:
+            return ids
+
+
+def test_pages_follow_sort_key_order(requests):
+    # Added out of order, with a created_at tie broken by id
+    for request_id, created_at in (('c', '2026-01-03T10:00'), ('a', '2026-01-01T10:00'),
+                                   ('e', '2026-01-02T10:00'), ('d', '2026-01-02T10:00')):
+        add_request(requests, request_id, created_at)
+    assert all_pages(requests, 'received', 2) == [['a', 'd'], ['e', 'c']]
+    assert all_pages(requests, 'sent', 3) == [['a', 'd', 'e'], ['c']]
+
+
+def test_pages_skip_requests_that_fail_the_filter(requests):
+    for i in range(6):
+        add_request(requests, f'r{i}', f'2026-01-0{i + 1}T10:00', 'pending' if i % 2 else 'accepted')
+    pending = all_pages(requests, 'received', 2, lambda r: r['status'] == 'pending')
+    assert pending == [['r1', 'r3'], ['r5']]
+
+
+def test_pages_see_removals_and_the_cursor_key(requests):
+    for i in range(4):
+        add_request(requests, f'r{i}', f'2026-01-0{i + 1}T10:00')
+    page, after = requests.page('received', 'user1', None, 2)
+    assert after == request_sort_key(page[-1])
+    requests.remove('r2')
+    page, after = requests.page('received', 'user1', after, 2)
+    assert [r['id'] for r in page] == ['r3'] and after is None
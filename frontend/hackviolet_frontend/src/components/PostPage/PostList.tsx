@@ -23,7 +23,9 @@ interface PostListProps {
 
 function PostList({ refreshTrigger }: PostListProps) {
     const [posts, setPosts] = useState<Post[]>([]);
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
     const [loading, setLoading] = useState(true);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [error, setError] = useState("");
     const [currentUserId, setCurrentUserId] = useState<string | null>(null);
     const [editingPost, setEditingPost] = useState<Post | null>(null);
@@ -35,17 +37,21 @@ function PostList({ refreshTrigger }: PostListProps) {
         party_size: "",
     });
 
+    const getFiltersToSend = () => {
+        const filtersToSend: any = {};
+        Object.entries(filters).forEach(([key, value]) => {
+            if (value) filtersToSend[key] = value;
+        });
+        return filtersToSend;
+    };
+
     const loadPosts = async () => {
         setLoading(true);
         setError("");
         try {
-            const filtersToSend: any = {};
-            Object.entries(filters).forEach(([key, value]) => {
-                if (value) filtersToSend[key] = value;
-            });
-            
-            const data = await postsAPI.getPosts(filtersToSend);
+            const data = await postsAPI.getPosts(getFiltersToSend());
             setPosts(data.posts || []);
+            setNextCursor(data.next_cursor || null);
         } catch (err: any) {
             setError(err.message || "Failed to load posts");
         } finally {
@@ -53,6 +59,20 @@ function PostList({ refreshTrigger }: PostListProps) {
         }
     };
 
+    const loadMorePosts = async () => {
+        if (!nextCursor) return;
+        setLoadingMore(true);
+        try {
+            const data = await postsAPI.getPosts(getFiltersToSend(), nextCursor);
+            setPosts((current) => [...current, ...(data.posts || [])]);
+            setNextCursor(data.next_cursor || null);
+        } catch (err: any) {
+            setError(err.message || "Failed to load posts");
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     useEffect(() => {
         loadPosts();
         // Get current user ID
@@ -236,6 +256,12 @@ function PostList({ refreshTrigger }: PostListProps) {
                     ))}
                 </div>
             )}
+
+            {!loading && nextCursor && (
+                <button onClick={loadMorePosts} disabled={loadingMore} className="load-more-btn">
+                    {loadingMore ? "Loading..." : "Load more"}
+                </button>
+            )}
         </div>
     );
 }
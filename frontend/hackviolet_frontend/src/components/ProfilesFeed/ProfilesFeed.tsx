@@ -16,7 +16,9 @@ interface Profile {
 
 function ProfilesFeed() {
     const [profiles, setProfiles] = useState<Profile[]>([]);
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
     const [loading, setLoading] = useState(true);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [error, setError] = useState("");
     const [filters, setFilters] = useState({
         gender: "",
@@ -31,20 +33,24 @@ function ProfilesFeed() {
         loadProfiles();
     }, []);
 
+    const getFiltersToSend = () => {
+        const filtersToSend: any = {};
+        if (filters.gender) filtersToSend.gender = filters.gender;
+        if (filters.experience_level) filtersToSend.experience_level = filters.experience_level;
+        if (filters.focus) filtersToSend.focus = filters.focus;
+        if (filters.age_min) filtersToSend.age_min = filters.age_min;
+        if (filters.age_max) filtersToSend.age_max = filters.age_max;
+        if (filters.same_gender_only) filtersToSend.same_gender_only = 'true';
+        return filtersToSend;
+    };
+
     const loadProfiles = async () => {
         setLoading(true);
         setError("");
         try {
-            const filtersToSend: any = {};
-            if (filters.gender) filtersToSend.gender = filters.gender;
-            if (filters.experience_level) filtersToSend.experience_level = filters.experience_level;
-            if (filters.focus) filtersToSend.focus = filters.focus;
-            if (filters.age_min) filtersToSend.age_min = filters.age_min;
-            if (filters.age_max) filtersToSend.age_max = filters.age_max;
-            if (filters.same_gender_only) filtersToSend.same_gender_only = 'true';
-            
-            const data = await profilesAPI.getProfiles(filtersToSend);
+            const data = await profilesAPI.getProfiles(getFiltersToSend());
             setProfiles(data.profiles || []);
+            setNextCursor(data.next_cursor || null);
         } catch (err: any) {
             setError(err.message || "Failed to load profiles");
         } finally {
@@ -52,6 +58,20 @@ function ProfilesFeed() {
         }
     };
 
+    const loadMoreProfiles = async () => {
+        if (!nextCursor) return;
+        setLoadingMore(true);
+        try {
+            const data = await profilesAPI.getProfiles(getFiltersToSend(), nextCursor);
+            setProfiles((current) => [...current, ...(data.profiles || [])]);
+            setNextCursor(data.next_cursor || null);
+        } catch (err: any) {
+            setError(err.message || "Failed to load profiles");
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     const handleFilterChange = (key: string, value: string) => {
         setFilters({ ...filters, [key]: value });
     };
@@ -235,6 +255,12 @@ function ProfilesFeed() {
                 </div>
             )}
 
+            {!loading && nextCursor && (
+                <button onClick={loadMoreProfiles} disabled={loadingMore} className="load-more-btn">
+                    {loadingMore ? "Loading..." : "Load more"}
+                </button>
+            )}
+
             {/* Full Profile Modal */}
             {selectedProfile && (
                 <div className="profile-modal-overlay" onClick={() => setSelectedProfile(null)}>
@@ -1,5 +1,5 @@
 import { useState, useEffect } from "react";
-import { verificationAPI, authAPI } from "../../util/api";
+import { verificationAPI, authAPI, openEventStream } from "../../util/api";
 import './VerificationBanner.css';
 
 function VerificationBanner() {
@@ -9,8 +9,11 @@ function VerificationBanner() {
 
     useEffect(() => {
         checkVerificationStatus();
-        // Re-check verification status every 5 seconds to catch updates
-        const interval = setInterval(checkVerificationStatus, 5000);
+        // The server pushes verification status over the event stream (on connect and when it changes)
+        const handleStatus = (event: MessageEvent) => {
+            setShowBanner(!JSON.parse(event.data).verified);
+        };
+        const closeEvents = openEventStream({ ready: handleStatus, verification: handleStatus });
         
         // Also check when page becomes visible (user returns to tab)
         const handleVisibilityChange = () => {
@@ -21,7 +24,7 @@ function VerificationBanner() {
         document.addEventListener('visibilitychange', handleVisibilityChange);
         
         return () => {
-            clearInterval(interval);
+            closeEvents();
             document.removeEventListener('visibilitychange', handleVisibilityChange);
         };
     }, []);
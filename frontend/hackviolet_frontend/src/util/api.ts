@@ -13,6 +13,51 @@ export const clearAuthToken = () => {
   localStorage.removeItem('auth_token');
 };
 
+const EVENT_RECONNECT_MS = 5000;
+
+// Server-sent event stream for the logged-in user; returns a function that closes it.
+// Events: 'ready' and 'verification' carry { verified }, 'request' carries
+// { request_id, type, status, version } when a request is sent or answered.
+export const openEventStream = (
+  listeners: Record<string, (event: MessageEvent) => void>
+): (() => void) => {
+  let source: EventSource | null = null;
+  let retry: ReturnType<typeof setTimeout> | undefined;
+  let closed = false;
+
+  const reconnect = () => {
+    if (!closed) retry = setTimeout(connect, EVENT_RECONNECT_MS);
+  };
+
+  const connect = async () => {
+    if (!getAuthToken()) return;
+    try {
+      // EventSource can't send an Authorization header, so the URL carries a single-use ticket, never the token
+      const { ticket } = await apiCall('/events/ticket', { method: 'POST' });
+      if (closed) return;
+      source = new EventSource(`${API_BASE_URL}/events?ticket=${encodeURIComponent(ticket)}`);
+      for (const [name, listener] of Object.entries(listeners)) {
+        source.addEventListener(name, listener);
+      }
+      // EventSource would retry with the spent ticket, so reconnect with a new one instead
+      source.onerror = () => {
+        source?.close();
+        source = null;
+        reconnect();
+      };
+    } catch {
+      reconnect();
+    }
+  };
+
+  connect();
+  return () => {
+    closed = true;
+    clearTimeout(retry);
+    source?.close();
+  };
+};
+
 // API call helper
 async function apiCall(endpoint: string, options: RequestInit = {}) {
   const token = getAuthToken();
@@ -186,19 +231,21 @@ export const postsAPI = {
     });
   },
 
+  // One page of posts; pass the previous page's next_cursor to get the next one
   getPosts: async (filters?: {
     workout_type?: string;
     location?: string;
     experience_level?: string;
     gender_preference?: string;
     party_size?: string;
-  }) => {
+  }, cursor?: string) => {
     const params = new URLSearchParams();
     if (filters) {
       Object.entries(filters).forEach(([key, value]) => {
         if (value) params.append(key, value);
       });
     }
+    if (cursor) params.append('cursor', cursor);
     const queryString = params.toString();
     return apiCall(`/posts${queryString ? `?${queryString}` : ''}`, {
       method: 'GET',
@@ -226,6 +273,7 @@ export const postsAPI = {
 
 // Profiles APIs
 export const profilesAPI = {
+  // One page of profiles; pass the previous page's next_cursor to get the next one
   getProfiles: async (filters?: {
     gender?: string;
     experience_level?: string;
@@ -233,13 +281,14 @@ export const profilesAPI = {
     age_min?: string;
     age_max?: string;
     same_gender_only?: boolean;
-  }) => {
+  }, cursor?: string) => {
     const params = new URLSearchParams();
     if (filters) {
       Object.entries(filters).forEach(([key, value]) => {
         if (value) params.append(key, value);
       });
     }
+    if (cursor) params.append('cursor', cursor);
     const queryString = params.toString();
     return apiCall(`/profiles${queryString ? `?${queryString}` : ''}`, {
       method: 'GET',
@@ -262,10 +311,20 @@ export const profilesAPI = {
 
 // Requests APIs
 export const requestsAPI = {
+  // All received and sent requests, following next_cursor through every page
   getRequests: async () => {
-    return apiCall('/requests', {
-      method: 'GET',
-    });
+    const received: any[] = [];
+    const sent: any[] = [];
+    let cursor: string | null = null;
+    do {
+      const data = await apiCall(`/requests${cursor ? `?cursor=${encodeURIComponent(cursor)}` : ''}`, {
+        method: 'GET',
+      });
+      received.push(...(data.received || []));
+      sent.push(...(data.sent || []));
+      cursor = data.next_cursor;
+    } while (cursor);
+    return { received, sent };
   },
 
   respondToRequest: async (requestId: string, response: 'accept' | 'reject') => {